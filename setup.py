@@ -16,6 +16,7 @@ check = setupmeta.commands:CheckCommand
 cleanall = setupmeta.commands:CleanCommand
 entrypoints = setupmeta.commands:EntryPointsCommand
 explain = setupmeta.commands:ExplainCommand
+meta = setupmeta.commands:QueryCommand
 version = setupmeta.commands:VersionCommand
 
 [setuptools.finalize_distribution_options]
@@ -6,36 +6,30 @@ download_url: archive/v{version}.tar.gz
 author: Zoran Simic zoran@simicweb.com
 """
 
+import fnmatch
 import io
 import os
-import platform
 import re
-import shutil
-import subprocess  # nosec
 import sys
-import tempfile
+import threading
+import time
 import warnings
 
-import setuptools
-
-try:
-    import pkg_resources
-
-except ImportError:  # pragma: no cover
-    warnings.warn("pkg_resources is not available, expect limited functionality", category=RuntimeWarning)
-    pkg_resources = None
-
 
 USER_HOME = os.path.expanduser("~")  # Used to pretty-print subfolders of ~
-DEBUG = os.environ.get("SETUPMETA_DEBUG")
+DEBUG = os.environ.get("SETUPMETA_DEBUG")  # Turns on tracing, optionally for given categories only, example: SETUPMETA_DEBUG=reqs,scm
+TRACE_CATEGORIES = ("scm", "reqs", "content", "timing")  # Categories of trace messages
 VERSION_FILE = ".setupmeta.version"  # File used to work with projects that are in a subfolder of a git checkout
 SCM_DESCRIBE = "SCM_DESCRIBE"  # Name of env var used as pass-through for cases where git checkout is not available
+TARGET_ENV = "SETUPMETA_TARGET_ENV"  # Name of env var stating target environment to evaluate requirement markers against (opt-in)
+TRUST_PKG_INFO = "SETUPMETA_TRUST_PKG_INFO"  # Name of env var allowing to take PKG-INFO and its .egg-info as-is, in sdists (opt-in)
 TESTING = False  # Set to True while running tests
 RE_SPACES = re.compile(r"\s+", re.MULTILINE)
 RE_VERSION_COMPONENT = re.compile(r"(\d+|[A-Za-z]+)")
 
-PLATFORM = platform.system().lower()
-WINDOWS = PLATFORM.startswith("win")
+# Modules such as setuptools, pkg_resources, subprocess or tempfile are imported on demand only (we're imported by every setup.py)
+# PLATFORM (example: "linux", "darwin", "windows") and pkg_resources are available as lazily computed attributes, see __getattr__()
+WINDOWS = sys.platform.startswith("win")
 PKGID = "[A-Za-z0-9][-A-Za-z0-9_.]*"
 
 # Simplistic parsing of known formats used in requirements.txt
@@ -43,12 +37,41 @@ RE_DEPENDENCY_AT = re.compile(r"\s*(%s)\s*@\s*(.+)" % PKGID)
 RE_DEPENDENCY_EGG = re.compile(r".+#egg=(%s).*" % PKGID)
 RE_SIMPLE_PIN = re.compile(r"^(%s)\s*==\s*([^;\s]+)\s*(;.*)?$" % PKGID)
 RE_WORDS = re.compile(r"[^\w]+")
+RE_FIRST_WORD = re.compile(r"[^\w]*(\w+)")
 RE_PKG_NAME = re.compile(r"^(%s)$" % PKGID)
+RE_REQ_NAME = re.compile(r"^(%s)" % PKGID)
+RE_REQ_PARTS = re.compile(r"^(%s)\s*(?:\[([^\]]*)\])?([^;]*)(?:;(.*))?$" % PKGID)  # Name, extras, specifier and marker
+RE_MARKER_TOKEN = re.compile(r"'[^']*'|\"[^\"]*\"|[<>=!~]+|[()]|[^\s<>=!~()'\"]+")
+RE_NAME_SEPARATORS = re.compile(r"[-_.]+")
+RE_QUOTED = re.compile(r"'[^']*'|\"[^\"]*\"")
+RE_EXTRA_MARKER = re.compile(r"\bextra\b")  # Marker referring to variable 'extra' (once quoted values are removed)
 
 ABSTRACT = "abstract"
 INDIRECT = "indirect"
 PINNED = "pinned"
 KNOWN_SECTIONS = {ABSTRACT, INDIRECT, PINNED}
+_PROJECT_NAMES = {}  # type: dict[str, str] # Names of local projects referred to from requirements.txt files, per folder
+_PARSED_REQUIREMENTS = {}  # type: dict[tuple, tuple] # Parsed requirements.txt files per (path, do_abstract, target): (signature, parsed)
+_PARSING_LOCK = threading.Lock()  # Guards _PARSING and _PARSING_WAITS (requirements files can be parsed from several threads)
+_PARSING = {}  # type: dict[tuple, tuple] # Requirements files being parsed, per key: (ident of thread parsing it, event set when done)
+_PARSING_WAITS = {}  # type: dict[int, tuple] # Key of requirements file each thread is waiting for
+REQ_OPTIONS_WITH_ENTRY = ("-e ", "--editable ", "-r ", "--requirement ")  # Options in requirements.txt files that we look at
+REQ_CONSTRAINT_OPTIONS = ("-c ", "--constraint ")  # Options referring to a constraints file
+
+# Where install_requires and tests_require get auto-filled from, first file found wins (.in files are preferred when present)
+REQUIREMENTS_FILES = ["requirements.in", "requirements.txt", "pinned.txt"]
+TESTS_REQUIREMENTS_FILES = [
+    "tests/requirements.in",
+    "test-requirements.in",
+    "requirements-test.in",
+    "dev-requirements.in",
+    "requirements-dev.in",
+    "tests/requirements.txt",  # Use the usual .txt when no .in files found
+    "test-requirements.txt",
+    "requirements-test.txt",
+    "dev-requirements.txt",
+    "requirements-dev.txt",
+]
 
 
 def abort(message):
@@ -61,14 +84,84 @@ def warn(message):
     warnings.warn(message, stacklevel=2)
 
 
-def trace(message):
-    """Output 'message' if tracing is on"""
+def tracing(category=None):
+    """
+    :param str|None category: Category of trace messages (one of TRACE_CATEGORIES), None: uncategorized
+    :return bool: True if trace messages of 'category' are to be shown
+    """
     if not DEBUG:
+        return False
+
+    if category is None or DEBUG is True:
+        return True
+
+    categories = listify(DEBUG, separator=",")
+    return category in categories or not any(c in TRACE_CATEGORIES for c in categories)
+
+
+def trace(message, *args, **kwargs):
+    """
+    Output 'message' if tracing is on, formatting is deferred so that calls cost next to nothing when tracing is off
+
+    :param str message: Message to show, '%' formatted with 'args' (if any)
+    :param args: Arguments for 'message'
+    :param str|None category: Category of message (one of TRACE_CATEGORIES), keyword only
+    :param bool shorten: If True, 'args' are shown via their short() representation, keyword only
+    """
+    if not DEBUG or not tracing(kwargs.get("category")):
         return
+
+    if args:
+        if kwargs.get("shorten"):
+            args = tuple(short(arg) for arg in args)
+
+        message = message % args
+
     sys.stderr.write(":: %s\n" % message)
     sys.stderr.flush()
 
 
+def get_pkg_resources():
+    """
+    :return module|None: pkg_resources, if available (imported on first use only, it is slow to import)
+    """
+    try:
+        import pkg_resources
+
+        return pkg_resources
+
+    except ImportError:  # pragma: no cover
+        warnings.warn("pkg_resources is not available, expect limited functionality", category=RuntimeWarning)
+        return None
+
+
+def __getattr__(name):
+    """
+    Module attributes that are costly to compute, and determined on first access only (PEP 562)
+
+    :param str name: Name of attribute
+    :return: Value of attribute (memoized as a regular module attribute)
+    """
+    if name == "PLATFORM":
+        import platform
+
+        value = platform.system().lower()
+
+    elif name == "pkg_resources":
+        value = get_pkg_resources()
+
+    else:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+    globals()[name] = value
+    return value
+
+
+if sys.version_info[:2] < (3, 7):  # pragma: no cover, module-level __getattr__ is not supported
+    PLATFORM = __getattr__("PLATFORM")
+    pkg_resources = __getattr__("pkg_resources")
+
+
 def pkg_req(text):
     """
     :param str|None text: Text to parse
@@ -76,12 +169,57 @@ def pkg_req(text):
     """
     if text:
         try:
-            return pkg_resources.Requirement(text)
+            return get_pkg_resources().Requirement(text)
 
         except Exception:
             return None
 
 
+def target_environment():
+    """
+    Target environment is opted into via env var SETUPMETA_TARGET_ENV, example: "python_version=3.8,sys_platform=linux".
+    Marker variables that are not stated take the value of the current interpreter ("current" alone: evaluate for current interpreter).
+
+    :return tuple|None: (variable, value) pairs of target environment, if one was stated
+    """
+    spec = os.environ.get(TARGET_ENV)
+    if spec:
+        result = {}
+        for item in listify(spec, separator=","):
+            key, _, value = item.partition("=")
+            if value:
+                result[key.strip()] = value.strip()
+
+        # Keep python_version and python_full_version consistent (don't mix target's one with current interpreter's other one)
+        if "python_version" in result and "python_full_version" not in result:
+            result["python_full_version"] = result["python_version"]
+
+        elif "python_full_version" in result and "python_version" not in result:
+            result["python_version"] = ".".join(result["python_full_version"].split(".")[:2])
+
+        return tuple(sorted(result.items()))
+
+
+def marker_applies(requirement, environment):
+    """
+    :param str requirement: Requirement to inspect (example: "foo; sys_platform == 'win32'")
+    :param tuple|None environment: Target environment, see target_environment()
+    :return bool: False if 'requirement' has a marker that does not apply to 'environment'
+    """
+    if environment is None or ";" not in requirement:
+        return True
+
+    req = pkg_req(requirement)
+    if req is None or not req.marker or RE_EXTRA_MARKER.search(RE_QUOTED.sub("", str(req.marker))):
+        return True  # Markers referring to 'extra' depend on how project gets installed, not on target environment
+
+    try:
+        return req.marker.evaluate(dict(environment))
+
+    except Exception:
+        return True
+
+
 def get_words(text):
     if text:
         return [s.strip() for s in RE_WORDS.split(text) if s.strip()]
@@ -261,6 +399,8 @@ def run_program(program, *args, **kwargs):
 
         return None if capture else 1
 
+    import subprocess  # nosec
+
     if capture is None:
         print("Running: %s" % represented)
         if TESTING:
@@ -284,16 +424,16 @@ def run_program(program, *args, **kwargs):
     output = decode(output)
     error = decode(error)
 
-    trace_msg = "ran [%s], exitcode: %s" % (represented, p.returncode)
     if output:
         output = output.rstrip()
-        trace_msg = "%s, output: [%s]" % (trace_msg, output.strip())
 
     if error:
         error = error.rstrip()
-        trace_msg = "%s, error: [%s]" % (trace_msg, error.strip())
 
-    trace(trace_msg)
+    if DEBUG:
+        output_msg = ", output: [%s]" % output.strip() if output else ""
+        error_msg = ", error: [%s]" % error.strip() if error else ""
+        trace("ran [%s], exitcode: %s%s%s", represented, p.returncode, output_msg, error_msg, category="scm")
 
     if capture:
         if p.returncode:
@@ -422,8 +562,162 @@ def relative_path(full_path):
     return full_path[len(MetaDefs.project_dir) + 1:] if full_path and full_path.startswith(MetaDefs.project_dir) else full_path
 
 
+def scanned_folder(path):
+    """
+    :param str path: Full path to folder to scan
+    :return list((str, bool))|None: (name, is_dir) for each entry in folder, None if 'path' is not a folder
+    """
+    try:
+        if hasattr(os, "scandir"):
+            return [(entry.name, entry.is_dir()) for entry in os.scandir(path)]
+
+        return [(name, os.path.isdir(os.path.join(path, name))) for name in os.listdir(path)]  # pragma: no cover, py2
+
+    except OSError:
+        return None
+
+
+class ProjectFiles:
+    """
+    Index of files in project, each folder is listed (with one 'scandir') on first lookup, and re-listed only once its listing
+    is older than 'max_age' seconds (long running processes such as 'serve' or 'explain --watch' then see files added since).
+    Avoids stat-ing every candidate path separately, which is expensive on slow (NFS mounted) file systems.
+    """
+
+    current = None  # type: ProjectFiles # Index for current MetaDefs.project_dir
+    max_age = 1  # type: float # Seconds after which a folder listing is considered stale
+
+    def __init__(self, root):
+        """
+        :param str root: Full path to project folder
+        """
+        self.root = root
+        self._listings = {}  # type: dict[str, tuple] # Per folder: time it was listed, and names mapped to True for sub-folders
+
+    def __repr__(self):
+        return "%s folders indexed in %s" % (len(self._listings), short(self.root))
+
+    @classmethod
+    def reset(cls):
+        """Forget current index (file system may have changed)"""
+        cls.current = None
+
+    def relative(self, path):
+        """
+        :param str path: Path to normalize
+        :return str|None: Path relative to self.root, None if 'path' is outside of project
+        """
+        if os.path.isabs(path):
+            if path == self.root:
+                return ""
+
+            if not path.startswith(self.root + os.sep):
+                return None
+
+            path = path[len(self.root) + 1:]
+
+        path = os.path.normpath(path)
+        if path == ".":
+            return ""
+
+        if path.startswith(".."):
+            return None
+
+        return path
+
+    def listing(self, folder=""):
+        """
+        :param str folder: Folder relative to project root
+        :return dict|None: Names in 'folder', mapped to True for sub-folders, None if 'folder' does not exist
+        """
+        now = time.time()
+        cached = self._listings.get(folder)
+        if cached is None or now - cached[0] > self.max_age:
+            listing = None
+            if not folder or self.is_dir(folder):
+                entries = scanned_folder(os.path.join(self.root, folder))
+                if entries is not None:
+                    listing = dict(entries)
+
+            cached = self._listings[folder] = (now, listing)
+
+        return cached[1]
+
+    def _entry(self, path):
+        """
+        :param str path: Path relative to project root
+        :return bool|None: True if folder, False if file, None if it does not exist
+        """
+        folder, name = os.path.split(path)
+        listing = self.listing(folder)
+        if listing:
+            return listing.get(name)
+
+    def is_dir(self, path):
+        """
+        :param str path: Path (relative to project, or absolute)
+        :return bool: True if 'path' is an existing folder
+        """
+        relative = self.relative(path)
+        if relative is None:
+            return os.path.isdir(os.path.join(self.root, path))  # Outside of project (relative paths are relative to project)
+
+        if not relative:
+            return self.listing() is not None
+
+        return self._entry(relative) is True
+
+    def is_file(self, path):
+        """
+        :param str path: Path (relative to project, or absolute)
+        :return bool: True if 'path' is an existing file
+        """
+        relative = self.relative(path)
+        if relative is None:
+            return os.path.isfile(os.path.join(self.root, path))  # Outside of project (relative paths are relative to project)
+
+        return bool(relative) and self._entry(relative) is False
+
+    def glob(self, pattern, folder=""):
+        """
+        :param str pattern: Pattern to match (example: README*)
+        :param str folder: Folder relative to project root
+        :return list(str): Sorted names of files in 'folder' matching 'pattern'
+        """
+        listing = self.listing(folder)
+        if listing:
+            return sorted(name for name, is_dir in listing.items() if not is_dir and fnmatch.fnmatch(name, pattern))
+
+        return []
+
+
+def project_files():
+    """
+    :return ProjectFiles: Index of files for current project_dir
+    """
+    if ProjectFiles.current is None or ProjectFiles.current.root != MetaDefs.project_dir:
+        ProjectFiles.current = ProjectFiles(MetaDefs.project_dir)
+
+    return ProjectFiles.current
+
+
+def clear_caches():
+    """Forget everything cached for the lifetime of this process (files may have changed since)"""
+    from setupmeta import content, model
+
+    ProjectFiles.reset()
+    _PROJECT_NAMES.clear()
+    _PARSED_REQUIREMENTS.clear()
+    content._PACKAGES_CACHE.clear()
+    model._EGG_INFO_LOCATIONS.clear()
+    model._SHARED_VALUES.clear()
+
+
 def readlines(relative_path, limit=0):
     if relative_path:
+        if not os.path.isabs(relative_path) and not project_files().is_file(relative_path):
+            return None
+
         try:
             result = []
             full_path = project_path(relative_path)
@@ -435,13 +729,34 @@ def readlines(relative_path, limit=0):
 
                     result.append(line)
 
-            trace("read %s lines from %s" % (len(result), relative_path))
+            trace("read %s lines from %s", len(result), relative_path, category="content")
             return result
 
         except IOError:
             return None
 
 
+def parallel_map(function, items, max_workers=8):
+    """
+    :param callable function: Function to call on each item
+    :param list items: Items to process
+    :param int max_workers: Max number of threads to use
+    :return list: Result of 'function' for each item, in the same order as 'items' (threads are used only for more than one item)
+    """
+    if len(items) <= 1:
+        return [function(item) for item in items]
+
+    from multiprocessing.pool import ThreadPool
+
+    pool = ThreadPool(min(len(items), max_workers))
+    try:
+        return pool.map(function, items)
+
+    finally:
+        pool.close()
+        pool.join()
+
+
 def requirements_from_text(text):
     """Transform contents of a requirements.txt file to an appropriate form for install_requires
     Example:
@@ -474,27 +789,150 @@ def requirements_from_file(path):
     """
     r = RequirementsFile.from_file(path)
     if r is not None:
-        return r.filled_requirements
+        return list(r.filled_requirements)  # Parsed file is shared, give caller its own copy
+
+
+def requirements_from_files(paths):
+    """
+    :param list(str) paths: Paths of requirements.txt files to read, in parallel (files they include are parsed only once)
+    :return dict(str, list|None): Parsed and abstracted requirements, per path
+    """
+    paths = non_repeat(paths)
+    return dict(zip(paths, parallel_map(requirements_from_file, paths)))
 
 
 def corrected_editable(link, editable):
     # Couldn't find a reference explaining why a git:// uri ends up being git+git:// when -e is used
     if editable and "git" in link and not link.startswith("git+"):
-        trace("  added git+ prefix to %s" % link)
+        trace("  added git+ prefix to %s", link, category="reqs")
         link = "git+%s" % link
 
     return link
 
 
+def _valid_name(name):
+    """
+    :param str|None name: Candidate project name
+    :return str|None: 'name', if it is a valid project name
+    """
+    m = name and RE_PKG_NAME.match(name.strip().strip("\"'"))
+    return m and m.group(1)
+
+
+def _section_value(path, section, key):
+    """
+    :param str path: Path to an .ini style file (such as setup.cfg or pyproject.toml)
+    :param str section: Section to look in (example: 'metadata')
+    :param str key: Key to look for
+    :return str|None: Value of 'key' in 'section', if any
+    """
+    current = None
+    for line in readlines(path) or []:
+        line = line.strip()
+        if line.startswith("["):
+            current = line.strip("[]").strip()
+
+        elif current == section and line.startswith(key):
+            k, sep, value = line.partition("=")
+            if sep and k.strip() == key:
+                return value.partition(" #")[0].strip()
+
+
+def static_project_name(path):
+    """
+    Determine name of project in folder 'path' without running its setup.py, from (by order of preference):
+    PKG-INFO, setup.cfg [metadata], pyproject.toml [project], setup.py's setup(name=...) or its __title__
+
+    :param str path: Path to project folder
+    :return str|None: Project name, if it could be statically determined
+    """
+    for line in readlines(os.path.join(path, "PKG-INFO"), limit=20) or []:
+        if line.startswith("Name:"):
+            return _valid_name(line[5:])
+
+    name = _valid_name(_section_value(os.path.join(path, "setup.cfg"), "metadata", "name"))
+    name = name or _valid_name(_section_value(os.path.join(path, "pyproject.toml"), "project", "name"))
+    setup_py = os.path.join(path, "setup.py")
+    if not name and os.path.isfile(setup_py):
+        name = setup_py_attrs(setup_py).get("name")
+        name = _valid_name(name) if isinstance(name, str) else None
+        if not name:
+            from setupmeta.model import RE_PY_VALUE
+
+            for line in readlines(setup_py) or []:
+                m = RE_PY_VALUE.match(line)
+                if m and m.group(1) == "title":
+                    return _valid_name(m.group(2))
+
+    return name
+
+
+def setup_py_project_name(path):
+    """
+    :param str path: Path to project folder
+    :return str|None: Project name, as reported by running 'setup.py --name'
+    """
+    setup_py = os.path.join(path, "setup.py")
+    if os.path.exists(setup_py):
+        output = run_program(sys.executable, setup_py, "--name", capture=True)
+        if output and not isinstance(output, int):
+            m = RE_PKG_NAME.match(output.strip())
+            if m:
+                return m.group(1)
+
+
+def resolve_project_names(paths):
+    """
+    Determine (and remember) names of projects in folders 'paths'.
+    Names are statically determined when possible, the remaining 'setup.py --name' launches are ran in parallel.
+
+    :param paths: Paths to project folders
+    """
+    pending = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if path not in _PROJECT_NAMES and path not in pending:
+            name = static_project_name(path)
+            if name:
+                _PROJECT_NAMES[path] = name
+
+            else:
+                pending.append(path)
+
+    _PROJECT_NAMES.update(zip(pending, parallel_map(setup_py_project_name, pending)))
+
+
 def extract_project_name_from_folder(path):
+    """
+    :param str|None path: Path to project folder
+    :return str|None: Name of project in that folder, if it can be determined
+    """
     if path:
-        setup_py = os.path.join(path, "setup.py")
-        if os.path.exists(setup_py):
-            output = run_program(sys.executable, setup_py, "--name", capture=True)
-            if output and not isinstance(output, int):
-                m = RE_PKG_NAME.match(output.strip())
-                if m:
-                    return m.group(1)
+        path = os.path.abspath(path)
+        if path not in _PROJECT_NAMES:
+            resolve_project_names([path])
+
+        return _PROJECT_NAMES[path]
+
+
+def local_project_folders(lines):
+    """
+    :param list(str) lines: Lines of a requirements.txt file
+    :return generator(str): Folders of local projects referred to by 'lines' (via file:// or an absolute path)
+    """
+    for line in lines:
+        if "/" not in line and "\\" not in line:
+            continue  # Fast path for the vast majority of lines
+
+        line = line.strip()
+        if line.startswith(("-e ", "--editable ")):
+            line = line.partition(" ")[2].strip()
+
+        if line.startswith("file://"):
+            yield line[7:].partition(" #")[0].strip()
+
+        elif line and os.path.isabs(line):
+            yield line.partition(" #")[0].strip()
 
 
 def extracted_dependency_link(line, editable):
@@ -508,28 +946,28 @@ def extracted_dependency_link(line, editable):
         return None, None
 
     if line.startswith("file:"):
-        trace("  found explicit file dependency link %s" % line)
+        trace("  found explicit file dependency link %s", line, category="reqs")
         if line.startswith("file://"):
             return line, extract_project_name_from_folder(line[7:].strip())
 
         return line, None
 
-    m = RE_DEPENDENCY_EGG.match(line)
+    m = "#egg=" in line and RE_DEPENDENCY_EGG.match(line)
     if m:
         link = corrected_editable(line, editable)
         name = m.group(1)
-        trace("  found egg dependency link %s %s" % (name, link))
+        trace("  found egg dependency link %s %s", name, link, category="reqs")
         return link, name
 
-    m = RE_DEPENDENCY_AT.match(line)
+    m = "@" in line and RE_DEPENDENCY_AT.match(line)
     if m:
         link = corrected_editable(m.group(2), editable)
         name = m.group(1)
-        trace("  found @ dependency link %s %s" % (name, link))
+        trace("  found @ dependency link %s %s", name, link, category="reqs")
         return link, name
 
     if os.path.isabs(line):
-        trace("  found folder dependency link %s" % line)
+        trace("  found folder dependency link %s", line, category="reqs")
         name = extract_project_name_from_folder(line.strip())
         return "file://%s" % line, name
 
@@ -547,6 +985,13 @@ def first_word(text):
 
 
 class ReqEntry(object):
+    """A requirement (or reference to another requirements file) found in a requirements.txt file"""
+
+    __slots__ = (
+        "parent", "source_path", "line_number", "parent_section", "local_section",
+        "given", "comment", "dependency_link", "editable", "requirement", "stated", "abstracted", "refers",
+    )
+
     def __init__(self, parent, source_path, line_number, parent_section, line):
         """
         :param RequirementsFile parent: Requirements.txt file where this line came from
@@ -557,7 +1002,6 @@ class ReqEntry(object):
         """
         self.parent = parent
         self.source_path = source_path
-        self.source = relative_path(source_path)
         self.line_number = line_number
         self.parent_section = parent_section
         self.local_section = None
@@ -567,6 +1011,7 @@ class ReqEntry(object):
         self.dependency_link = None  # Extracted dependency link, if any
         self.editable = False  # True if dependency link is editable
         self.requirement = None  # Associated requirement name, if any
+        self.stated = None  # Requirement as stated in file (before abstraction)
         self.abstracted = None  # True if self.requirement was auto-abstracted
         self.refers = None  # Another requirements.txt this one refers to
         if not line or line.startswith("#"):
@@ -588,16 +1033,7 @@ class ReqEntry(object):
             line = p[2].strip()
 
         elif line.startswith("-r ") or line.startswith("--requirement "):
-            _, _, self.refers = line.partition(" ")
-            self.refers = self.refers.strip()
-            if self.refers:
-                if self.source_path:
-                    base = os.path.dirname(self.source_path)
-                    if base:
-                        self.refers = os.path.join(base, self.refers)
-
-                self.refers = os.path.abspath(self.refers)
-
+            self.refers = referred_path(self.source_path, line)
             return
 
         if not line or (line[0] not in "_./\\" and not line[0].isalnum()):
@@ -605,20 +1041,21 @@ class ReqEntry(object):
             return
 
         self.dependency_link, self.requirement = extracted_dependency_link(line, self.editable)
+        self.stated = self.requirement
         if not self.dependency_link and not self.requirement:
             self.comment = None  # Ensure potential comment on the line doesn't count as section
 
         if self.parent.do_abstract and not self.dependency_link and self.requirement and self.section != INDIRECT:
             # Abstract only very specific and simple name==version reqs, that are not in an explicitly 'pinned' section
             self.abstracted = False
-            if self.section != PINNED:
+            if self.section != PINNED and "==" in self.requirement:
                 m = RE_SIMPLE_PIN.match(self.requirement)
                 if m:
                     prev = self.requirement
                     name = m.group(1)
                     spec = m.group(3)
                     self.requirement = name if not spec else "%s%s" % (name, spec)
-                    trace("  abstracted [%s] -> [%s]" % (prev, self.requirement))
+                    trace("  abstracted [%s] -> [%s]", prev, self.requirement, category="reqs")
                     self.abstracted = True
 
     def __repr__(self):
@@ -638,6 +1075,11 @@ class ReqEntry(object):
         result.append(self.source_description)
         return " ".join(result)
 
+    @property
+    def source(self):
+        """str|None: Where this req came from, relative to current project when applicable (parsed files can be shared by projects)"""
+        return relative_path(self.source_path)
+
     @property
     def is_empty(self):
         return not self.dependency_link and not self.requirement and not self.refers
@@ -669,43 +1111,374 @@ class ReqEntry(object):
         comment = comment.strip()
         if comment:
             self.comment = comment
-            w = first_word(self.comment)
-            if w in KNOWN_SECTIONS:
-                return w
+            return comment_section(comment)
+
+
+def referred_path(source_path, line):
+    """
+    :param str|None source_path: Path to requirements.txt file where 'line' comes from
+    :param str line: Option referring to another file (example: "-r base.txt")
+    :return str|None: Full path of referred file (relative paths are relative to folder of 'source_path')
+    """
+    path = line.partition(" ")[2].partition(" #")[0].strip()
+    if path:
+        if source_path:
+            base = os.path.dirname(source_path)
+            if base:
+                path = os.path.join(base, path)
+
+        return os.path.abspath(path)
 
 
 def non_repeat(items):
     result = []
+    seen = set()
     for i in items:
-        if i and i not in result:
+        if i and i not in seen:
+            seen.add(i)
             result.append(i)
 
     return result
 
 
+def canonical_name(name):
+    """
+    :param str name: Project name
+    :return str: PEP 503 normalized form of 'name' (example: Foo_Bar -> foo-bar)
+    """
+    return RE_NAME_SEPARATORS.sub("-", name).lower()
+
+
+def normalized_marker(marker):
+    """
+    :param str|None marker: Environment marker (example: python_version<'3')
+    :return str: Same marker, with uniform spacing and quoting (example: python_version < "3")
+    """
+    tokens = RE_MARKER_TOKEN.findall(marker or "")
+    return " ".join('"%s"' % t[1:-1] if t[0] in "'\"" else t for t in tokens)
+
+
+def with_extras(requirement, extras):
+    """
+    :param str requirement: Requirement (example: requests>=2)
+    :param list(str) extras: Extras to state
+    :return str: 'requirement' with its extras (if any) replaced by 'extras' (example: requests[socks]>=2)
+    """
+    m = RE_REQ_PARTS.match(requirement)
+    if not m:
+        return requirement
+
+    return "%s[%s]%s" % (m.group(1), ",".join(extras), requirement[m.end(2) + 1 if m.group(2) is not None else m.end(1):])
+
+
+class RequirementIndex(object):
+    """
+    Requirements seen so far, by PEP 503 canonical name and marker, in first-seen order.
+    Dependency links are keyed by link, several links can be stated for the same project (they all end up in 'dependency_links')
+    """
+
+    def __init__(self):
+        self.by_key = {}  # type: dict[tuple, tuple] # (entry, spec, extras) of first requirement seen, per (canonical name, marker)
+        self.conflicts = []  # type: list[tuple[ReqEntry, ReqEntry]] # (kept, dropped) pairs of conflicting requirements
+
+    @staticmethod
+    def parsed(req_entry):
+        """
+        :param ReqEntry req_entry: Requirement to inspect
+        :return (tuple, str, list): Key identifying project (and marker) 'req_entry' refers to, its specifier (without spaces) and extras
+        """
+        m = not req_entry.dependency_link and RE_REQ_PARTS.match(req_entry.stated or "")
+        if not m:
+            return (req_entry.stated, req_entry.dependency_link), None, []
+
+        name, extras, spec, marker = m.groups()
+        spec = spec.replace(" ", "")
+        extras = sorted(set(canonical_name(e.strip()) for e in (extras or "").split(",") if e.strip()))
+        return (canonical_name(name), normalized_marker(marker)), spec, extras
+
+    def add(self, req_entry):
+        """
+        :param ReqEntry req_entry: Requirement to add
+        :return bool: True if 'req_entry' was not seen yet, False if it is a repeat (or conflicts with a previous one)
+        """
+        key, spec, extras = self.parsed(req_entry)
+        spec = spec and ",".join(sorted(spec.split(",")))  # Order of version clauses doesn't matter
+        first = self.by_key.get(key)
+        if first is None:
+            self.by_key[key] = (req_entry, spec, extras)
+            return True
+
+        if first[1] != spec:
+            self.conflicts.append((first[0], req_entry))
+            warn("Conflicting requirements for '%s': '%s' %s, and '%s' %s (using the first one)" % (
+                key[0], first[0].stated, first[0].source_description, req_entry.stated, req_entry.source_description
+            ))
+
+        elif not set(extras).issubset(first[2]):
+            # Same requirement, with more extras: extras of both get kept
+            extras = sorted(set(first[2]).union(extras))
+            first[0].requirement = with_extras(first[0].requirement, extras)
+            self.by_key[key] = (first[0], spec, extras)
+
+        return False
+
+
+def comment_section(comment):
+    """
+    :param str comment: Comment to inspect
+    :return str|None: Section that 'comment' starts, if any (one of: abstract, indirect or pinned)
+    """
+    m = RE_FIRST_WORD.match(comment)
+    if m:
+        w = m.group(1).lower()
+        if w in KNOWN_SECTIONS:
+            return w
+
+
+def extracted_hashes(text, hashes):
+    """
+    :param str text: Part of a line containing only '--hash' options (as generated by 'pip-compile --generate-hashes')
+    :param list|None hashes: Hashes extracted so far
+    :return list: Hashes extracted so far, plus the ones found in 'text'
+    """
+    hashes = hashes or []
+    tokens = text.split()
+    for i, token in enumerate(tokens):
+        if token.startswith("--hash="):
+            hashes.append(token[7:])
+
+        elif token == "--hash" and i + 1 < len(tokens):
+            hashes.append(tokens[i + 1])
+
+    return hashes
+
+
+def logical_lines(lines):
+    """
+    Join backslash-continued lines, and extract '--hash' options on the fly
+
+    :param list(str) lines: Physical lines
+    :return generator((int, str, tuple|None)): Number of first physical line, stripped logical line (without hashes), hashes (if any)
+    """
+    number = None
+    parts = None
+    hashes = None
+    for n, line in enumerate(lines, start=1):
+        line = line.replace("\t", " ").strip()
+        if parts is None:
+            number = n
+            parts = []
+
+        continued = False
+        if line.startswith("--hash"):
+            # Fast path for hash-only lines (the bulk of lock files generated with --generate-hashes)
+            continued = line.endswith("\\")
+            hashes = extracted_hashes(line[:-1] if continued else line, hashes)
+
+        elif line.startswith("#"):
+            parts.append(line)  # A comment ends current logical line
+
+        elif line:
+            continued = line.endswith("\\")
+            if continued:
+                line = line[:-1].rstrip()
+
+            if " --hash" in line:
+                i = line.index(" --hash")
+                hashes = extracted_hashes(line[i:], hashes)
+                line = line[:i].rstrip()
+
+            parts.append(line)
+
+        if not continued:
+            yield number, " ".join(parts), hashes and tuple(hashes)
+            parts = None
+            hashes = None
+
+    if parts is not None:
+        yield number, " ".join(parts), hashes and tuple(hashes)
+
+
 def iterate_req_txt(seen, parent, source_path, lines):
+    """
+    Single pass over 'lines': blank lines, comments and options are classified by their first character,
+    a ReqEntry is created only for lines that look like a requirement (or a reference to another requirements file)
+
+    :param set seen: Requirement files seen so far (each is scanned only once)
+    :param RequirementsFile parent: Requirements.txt file being scanned
+    :param str|None source_path: Path to file being scanned
+    :param list(str) lines: Lines to scan
+    """
     if lines:
+        resolve_project_names(local_project_folders(lines))  # Resolve names of all local projects at once (in parallel if needed)
         current_section = None
-        for n, line in enumerate(lines, start=1):
+        for n, line, hashes in logical_lines(lines):
+            if not line:
+                continue
+
+            first = line[0]
+            if first == "#":
+                # Lines containing only a comment can start a "section", all requirements below this will respect that section
+                current_section = comment_section(line[1:]) or current_section
+                continue
+
+            if first == "-":
+                if line.startswith(REQ_CONSTRAINT_OPTIONS):
+                    path = referred_path(source_path, line)
+                    if path:
+                        parent.add_constraints(path)
+
+                    continue
+
+                if not line.startswith(REQ_OPTIONS_WITH_ENTRY):
+                    continue  # Options such as --index-url or --hash are not requirements
+
+            elif first not in "_./\\" and not first.isalnum():
+                continue  # Ignore anything that doesn't look like a valid req
+
             req_entry = ReqEntry(parent, source_path, n, current_section, line)
             if req_entry.is_empty:
-                if req_entry.parent_section:
-                    # Lines containing only a comment can start a "section", all requirements below this will respect that section
-                    current_section = req_entry.parent_section
-
                 continue
 
-            trace("  req entry: %s" % req_entry)
-            if req_entry.refers and req_entry.refers not in seen:
-                seen.add(req_entry.refers)
-                for r in iterate_req_txt(seen, parent, req_entry.refers, readlines(req_entry.refers)):
-                    yield r
+            trace("  req entry: %s", req_entry, category="reqs")
+            if req_entry.refers:
+                if req_entry.refers not in seen:
+                    seen.add(req_entry.refers)
+                    for r in included_requirements(parent, req_entry.refers):
+                        yield r
 
-            else:
-                key = "%s %s" % (req_entry.requirement, req_entry.dependency_link)
-                if key not in seen:
-                    seen.add(key)
-                    yield req_entry
+            elif parent.index.add(req_entry):
+                if hashes:
+                    m = RE_REQ_NAME.match(line)
+                    if m:
+                        parent.hashes[m.group(1)] = hashes
+
+                yield req_entry
+
+
+def included_requirements(parent, path):
+    """
+    :param RequirementsFile parent: Requirements.txt file referring to 'path' via '-r'
+    :param str path: Full path of referred requirements.txt file
+    """
+    parent.sources.append(path)
+    if path in parent.included_from:
+        parent.is_cyclic = True  # Parsed contents of 'parent' then depend on which file it was included from
+        return
+
+    included = parsed_requirements(path, do_abstract=parent.do_abstract, included_from=parent.included_from)
+    if included is not None:
+        parent.is_cyclic = parent.is_cyclic or included.is_cyclic
+        parent.sources.extend(included.sources)
+        for name, hashes in included.hashes.items():
+            parent.hashes.setdefault(name, hashes)
+
+        parent.index.conflicts.extend(included.index.conflicts)
+        parent.merge_constraints(included)
+        for r in included.reqs:
+            if parent.index.add(r):
+                yield r
+
+
+def files_signature(paths):
+    """
+    :param list(str) paths: Paths to files
+    :return tuple: (mtime in ns, size, inode) of each file (inode changes when editors save via a rename), None for missing files
+    """
+    result = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            result.append((getattr(st, "st_mtime_ns", st.st_mtime), st.st_size, st.st_ino))
+
+        except OSError:
+            result.append(None)
+
+    return tuple(result)
+
+
+def parsed_requirements(path, do_abstract=True, included_from=()):
+    """
+    Parsed requirements.txt files are shared per run (as long as the files they were read from don't change, see files_signature()),
+    so that a file referred to from several places (via '-r', or '@file' in setup.py) is parsed only once.
+    Parsed files hold full paths only, so they can be shared by several projects (sources are made relative on access).
+
+    :param str path: Path to requirements.txt file to read
+    :param bool do_abstract: If True, automatically abstract reqs of the form <name>==<version>
+    :param tuple(str) included_from: Full paths of files currently being parsed that led to 'path' (via '-r')
+    :return RequirementsFile|None: Parsed file, if possible
+    """
+    full_path = os.path.abspath(project_path(path))
+    key = (full_path, do_abstract, target_environment())
+    req = _cached_requirements(key)
+    if req is not None:
+        return req
+
+    claimed = _claimed_parse(key)
+    try:
+        if not claimed:
+            req = _cached_requirements(key)  # Parsed by another thread while we were waiting
+            if req is not None:
+                return req
+
+        req = RequirementsFile(do_abstract=do_abstract)
+        req.included_from = included_from + (full_path,)
+        req.sources.append(full_path)
+        signature = files_signature([full_path])
+        req.scan(readlines(path), source_path=full_path)
+        if req.reqs is not None:
+            req.finalize()
+            if not req.is_cyclic:
+                _PARSED_REQUIREMENTS[key] = (signature + files_signature(req.sources[1:]), req)
+
+            return req
+
+    finally:
+        if claimed:
+            with _PARSING_LOCK:
+                _PARSING.pop(key)[1].set()
+
+
+def _cached_requirements(key):
+    """
+    :param tuple key: Key of parsed requirements file, see parsed_requirements()
+    :return RequirementsFile|None: Parsed file, if it was already parsed (and none of the files it was read from changed since)
+    """
+    cached = _PARSED_REQUIREMENTS.get(key)
+    if cached is not None and cached[0] == files_signature(cached[1].sources):
+        return cached[1]
+
+
+def _claimed_parse(key):
+    """
+    Wait for completion if another thread is currently parsing requirements file 'key'
+
+    :param tuple key: Key of requirements file to parse, see parsed_requirements()
+    :return bool: True if current thread is now the one parsing 'key' (others will wait for it)
+    """
+    ident = threading.current_thread().ident
+    with _PARSING_LOCK:
+        claim = _PARSING.get(key)
+        if claim is None:
+            _PARSING[key] = (ident, threading.Event())
+            return True
+
+        owner = claim[0]
+        while owner is not None:
+            if owner == ident:
+                # Waiting would deadlock (cyclic '-r' references, parsed from several threads)
+                return False
+
+            waited = _PARSING_WAITS.get(owner)
+            owner = waited and _PARSING.get(waited, (None,))[0]
+
+        _PARSING_WAITS[ident] = key
+
+    claim[1].wait()
+    with _PARSING_LOCK:
+        del _PARSING_WAITS[ident]
+
+    return False
 
 
 class RequirementsFile:
@@ -713,13 +1486,20 @@ class RequirementsFile:
 
     def __init__(self, do_abstract=True):
         self.do_abstract = do_abstract
+        self.hashes = {}  # type: dict[str, tuple] # Hashes stated via '--hash' per requirement name (for a future integrity check)
+        self.included_from = ()  # type: tuple[str] # Full paths of files being parsed, that led to this one (via '-r')
+        self.index = RequirementIndex()  # Requirements seen so far, used to skip repeats and report conflicts
+        self.sources = []  # type: list[str] # Full paths of files this was read from (including files referred to via '-r')
+        self.is_cyclic = False  # True if a '-r' reference back to one of the files in 'self.included_from' was skipped
+        self.constraints = {}  # type: dict[str, ReqEntry] # Constraints stated via '-c' (including in '-r' files), per canonical name
         self.reqs = None
         self.dependency_links = None
         self.abstracted = None
         self.filled_requirements = None
         self.ignored = None
+        self.dropped = None  # type: list[ReqEntry] # Requirements with a marker that doesn't apply to target environment (if any stated)
         self.untouched = None
-        self.source = None
+        self.source_path = None  # type: str # Full path of first file requirements were found in
 
     def scan(self, lines, source_path=None):
         if lines is None:
@@ -735,17 +1515,117 @@ class RequirementsFile:
         for r in iterate_req_txt(seen, self, source_path, lines):
             self.reqs.append(r)
 
+    def add_constraints(self, path):
+        """
+        :param str path: Full path to constraints file to take into account (parsed once per run, no matter how many files refer to it)
+        """
+        self.sources.append(path)
+        if path in self.included_from:
+            self.is_cyclic = True
+            return
+
+        constraints = parsed_requirements(path, do_abstract=False, included_from=self.included_from)
+        if constraints is not None:
+            self.is_cyclic = self.is_cyclic or constraints.is_cyclic
+            self.sources.extend(constraints.sources)
+            for r in constraints.reqs:
+                name = RequirementIndex.parsed(r)[0][0]
+                if name:
+                    self.constraints.setdefault(name, r)
+
+            self.merge_constraints(constraints)
+
+    def merge_constraints(self, other):
+        """
+        :param RequirementsFile other: File included from this one, constraints apply to all files of an install
+        """
+        for name, constraint in other.constraints.items():
+            self.constraints.setdefault(name, constraint)
+
+    def constraint_for(self, req_entry):
+        """
+        :param ReqEntry req_entry: Requirement to inspect
+        :return ReqEntry|None: Constraint stated for the project 'req_entry' refers to, if any
+        """
+        if self.constraints and req_entry.requirement and not req_entry.dependency_link:
+            return self.constraints.get(RequirementIndex.parsed(req_entry)[0][0])
+
+    def constrained(self, req_entry):
+        """
+        :param ReqEntry req_entry: Requirement to inspect
+        :return str: Requirement, with version pinned from constraints file if 'req_entry' is in a 'pinned' section without a version
+        """
+        requirement = req_entry.requirement
+        if req_entry.section == PINNED:
+            constraint = self.constraint_for(req_entry)
+            if constraint is not None:
+                text, _, marker = requirement.partition(";")
+                text = text.strip()
+                if RE_PKG_NAME.match(text):
+                    spec = RequirementIndex.parsed(constraint)[1]
+                    requirement = "%s%s%s" % (text, spec, marker and ";%s" % marker)
+
+        return requirement
+
+    def status(self, req_entry):
+        """
+        :param ReqEntry req_entry: Requirement from this file
+        :return str: How 'req_entry' was handled: abstracted, pinned, untouched, ignored, dropped or as-is
+        """
+        if req_entry.is_ignored:
+            return "ignored"
+
+        if self.dropped and req_entry in self.dropped:
+            return "dropped"
+
+        if req_entry.abstracted:
+            return "abstracted"
+
+        if req_entry.abstracted is False:
+            return "pinned" if "==" in self.constrained(req_entry) else "untouched"
+
+        return "as-is"
+
+    def snapshot(self):
+        """
+        :return dict(str, list): Compact (json serializable) view of requirements, per project name (and marker):
+                                 [status, requirement as filled, where it came from]
+        """
+        result = {}
+        for r in self.reqs:
+            if r.requirement:
+                key = " ".join(k for k in RequirementIndex.parsed(r)[0] if k)
+                result.setdefault(key, [self.status(r), self.constrained(r), "%s:%s" % (r.source or "adhoc", r.line_number)])
+
+        return result
+
     def finalize(self):
+        environment = target_environment()
+        filled = []
+        self.dropped = []
+        for r in self.reqs:
+            if r.requirement and not r.is_ignored:
+                if marker_applies(r.requirement, environment):
+                    filled.append(self.constrained(r))
+
+                else:
+                    self.dropped.append(r)
+
         self.dependency_links = [r.dependency_link for r in self.reqs if r.dependency_link and not r.is_ignored]
-        self.filled_requirements = non_repeat([r.requirement for r in self.reqs if r.requirement and not r.is_ignored])
+        self.filled_requirements = non_repeat(filled)
         self.abstracted = [r for r in self.reqs if r.abstracted is True]
         self.ignored = [r for r in self.reqs if r.requirement and r.is_ignored]
         self.untouched = [r for r in self.reqs if r.abstracted is False]
         for r in self.reqs:
-            if r.source:
-                self.source = r.source
+            if r.source_path:
+                self.source_path = r.source_path
                 break
 
+    @property
+    def source(self):
+        """str|None: Where requirements came from, relative to current project when applicable"""
+        return relative_path(self.source_path)
+
     @classmethod
     def from_file(cls, *paths, **kwargs):
         """
@@ -753,7 +1633,11 @@ class RequirementsFile:
         :param bool do_abstract: If True, automatically abstract reqs of the form <name>==<version>
         :return RequirementsFile|None: Associated object, if possible
         """
-        req = cls(do_abstract=kwargs.pop("do_abstract", True))  # `kwargs` needed because of py2
+        do_abstract = kwargs.pop("do_abstract", True)  # `kwargs` needed because of py2
+        if len(paths) == 1 and paths[0]:
+            return parsed_requirements(paths[0], do_abstract=do_abstract)
+
+        req = cls(do_abstract=do_abstract)
         for path in paths:
             if path:
                 req.scan(readlines(path), source_path=os.path.abspath(path))
@@ -765,11 +1649,12 @@ class RequirementsFile:
 
 def find_requirements(do_abstract, *relative_paths):
     """ Read old-school requirements.txt type file """
+    files = project_files()
     for path in relative_paths:
         if path:
             path = project_path(path)
-            if os.path.isfile(path):
-                trace("found requirements: %s %s" % (path, " (auto-abstracted)" if do_abstract else ""))
+            if files.is_file(path):
+                trace("found requirements: %s %s", path, " (auto-abstracted)" if do_abstract else "", category="reqs")
                 r = RequirementsFile.from_file(path, do_abstract=do_abstract)
                 if r is not None:
                     return r
@@ -787,26 +1672,14 @@ class Requirements:
             self.install_requires = RequirementsFile.from_file(pkg_info.requires_txt, pkg_info.dependency_links, do_abstract=False)
             self.tests_require = None
 
+        elif pkg_info and pkg_info.is_trusted:
+            # No requires.txt in a trusted .egg-info: project has no requirements
+            self.install_requires = None
+            self.tests_require = None
+
         else:
-            self.install_requires = find_requirements(
-                True,
-                "requirements.in",  # .in files are preferred when present
-                "requirements.txt",
-                "pinned.txt",
-            )
-            self.tests_require = find_requirements(
-                False,
-                "tests/requirements.in",  # .in files are preferred when present
-                "test-requirements.in",
-                "requirements-test.in",
-                "dev-requirements.in",
-                "requirements-dev.in",
-                "tests/requirements.txt",  # Use the usual .txt when no .in files found
-                "test-requirements.txt",
-                "requirements-test.txt",
-                "dev-requirements.txt",
-                "requirements-dev.txt",
-            )
+            self.install_requires = find_requirements(True, *REQUIREMENTS_FILES)
+            self.tests_require = find_requirements(False, *TESTS_REQUIREMENTS_FILES)
             if self.install_requires and self.install_requires.reqs:
                 self.has_abstractions = any(not r.dependency_link for r in self.install_requires.reqs)
 
@@ -823,6 +1696,17 @@ class Requirements:
                 if req.dependency_link:
                     return req.source
 
+    @property
+    def source_paths(self):
+        """list(str): Full paths of all requirement files used, including the ones referred to via '-r' or '-c'"""
+        paths = set()
+        for req in (self.install_requires, self.tests_require):
+            if req:
+                paths.update(req.sources)
+                paths.update(r.source_path for r in req.reqs if r.source_path)
+
+        return sorted(paths)
+
 
 class current_folder:
     """
@@ -848,6 +1732,8 @@ class temp_resource:
     """
 
     def __init__(self):
+        import tempfile
+
         self.old_cwd = os.getcwd()
         self.path = tempfile.mkdtemp()
         # OSX edge case: /var/<temp> is really /private/var/<temp>
@@ -858,6 +1744,8 @@ class temp_resource:
         return self.path
 
     def __exit__(self, *args):
+        import shutil
+
         os.chdir(self.old_cwd)
         try:
             shutil.rmtree(self.path)
@@ -868,6 +1756,8 @@ class temp_resource:
 
 def meta_command_init(self, dist, **kwargs):
     """Custom __init__ injected to commands decorated with @MetaCommand"""
+    import setuptools
+
     self.setupmeta = getattr(dist, "_setupmeta", None)
     setuptools.Command.__init__(self, dist, **kwargs)
 
@@ -907,6 +1797,8 @@ class MetaDefs:
     @classmethod
     def register_command(cls, command):
         """ Register our own 'command' """
+        import setuptools
+
         command.description = command.__doc__.strip().split("\n")[0]
         command.__init__ = meta_command_init
         if command.initialize_options == setuptools.Command.initialize_options:
@@ -971,6 +1863,81 @@ class MetaDefs:
             setattr(dist, key, value)
 
 
+def setup_py_attrs(setup_py_path):
+    """
+    Statically extract the keyword arguments of the setup() call in 'setup_py_path', without running it.
+    Only literal values are extracted (strings, numbers, lists, dicts etc), other arguments are ignored.
+
+    :param str setup_py_path: Path to setup.py
+    :return dict: Literal keyword arguments passed to setup()
+    """
+    import ast
+
+    try:
+        with io.open(setup_py_path, "rb") as fh:
+            tree = ast.parse(fh.read(), filename=setup_py_path)
+
+    except (IOError, SyntaxError, ValueError) as e:
+        trace("can't parse %s: %s", setup_py_path, e, category="content")
+        return {}
+
+    result = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            func = node.func
+            name = func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", None)
+            if name == "setup":
+                for keyword in node.keywords:
+                    if keyword.arg:
+                        try:
+                            result[keyword.arg] = ast.literal_eval(keyword.value)
+
+                        except ValueError:
+                            trace("ignoring non-literal setup() argument '%s' in %s", keyword.arg, setup_py_path, category="content")
+
+    return result
+
+
+def compute(project_dir, fields=None, attrs=None):
+    """
+    Compute metadata of project in 'project_dir', without going through setuptools (no Distribution object involved)
+
+    :param str project_dir: Folder where project's setup.py resides
+    :param list(str)|str|None fields: Fields of interest, list or comma separated (default: all fields)
+    :param dict|None attrs: Attributes explicitly passed to setup() (default: literal arguments of setup() call in setup.py)
+    :return dict(str, setupmeta.model.Definition): Computed definitions, with their value and sources
+    """
+    from setupmeta.cache import cached_definitions
+    from setupmeta.model import _SHARED_VALUES, PSEUDO_FIELDS, SetupMeta
+
+    setup_py_path = os.path.join(os.path.abspath(project_dir), "setup.py")
+    if attrs is None:
+        attrs = setup_py_attrs(setup_py_path)
+
+    attrs = dict(attrs, _setup_py_path=setup_py_path)
+    if fields is not None:
+        fields = [PSEUDO_FIELDS.get(key, key) for key in listify(fields, separator=",")]
+
+    def finalized():
+        meta = SetupMeta().preprocess(dict(attrs))
+        meta.fields = set(MetaDefs.all_fields if fields is None else fields)  # Only requested fields get computed
+        meta.finalize(attrs)
+        return meta
+
+    old_project_dir = MetaDefs.project_dir
+    try:
+        definitions = cached_definitions(os.path.dirname(setup_py_path), attrs, fields, finalized)
+
+    finally:
+        MetaDefs.project_dir = old_project_dir
+        _SHARED_VALUES.clear()  # Values are shared within one computation only, long-running processes don't keep them around
+
+    if fields is None:
+        return definitions
+
+    return dict((key, definitions[key]) for key in fields if key in definitions)
+
+
 class Console:
     """Small helper to determine terminal width, used to try and get a nice fit for commands like 'explain'"""
 
@@ -0,0 +1,70 @@
+"""
+PEP 517 build backend, wrapping setuptools.build_meta
+
+Frontends such as pip call each hook of a build in a separate subprocess.
+This backend computes setupmeta's definitions once per build, and persists them in the build's metadata directory,
+subsequent hooks of the same build (such as 'build_wheel') then reuse them instead of computing them again.
+
+Usage, in pyproject.toml:
+
+    [build-system]
+    requires = ["setupmeta", "setuptools", "wheel"]
+    build-backend = "setupmeta.build_meta"
+"""
+
+import os
+
+from setuptools import build_meta as _orig
+from setuptools.build_meta import build_sdist, get_requires_for_build_sdist, get_requires_for_build_wheel  # noqa: F401
+
+from setupmeta import hook
+
+
+METADATA_FILE = "setupmeta.json"  # Name of file holding finalized definitions, in build's metadata directory
+
+
+def _persisted_metadata_path(metadata_directory):
+    """
+    :param str|None metadata_directory: Build's metadata directory, if any
+    :return str|None: Path to json file holding definitions finalized by a previous hook of the same build
+    """
+    if metadata_directory:
+        folder = os.path.abspath(metadata_directory)
+        if folder.endswith(".dist-info"):
+            # Build hooks get the .dist-info folder that was created by prepare_metadata_for_build_wheel()
+            folder = os.path.dirname(folder)
+
+        return os.path.join(folder, METADATA_FILE)
+
+
+def _with_persisted_metadata(metadata_directory, function, *args):
+    """
+    :param str|None metadata_directory: Build's metadata directory, if any
+    :param callable function: Hook from setuptools.build_meta to call
+    :param args: Arguments to pass through to 'function'
+    :return: Whatever 'function' returned
+    """
+    hook.persisted_metadata = _persisted_metadata_path(metadata_directory)
+    try:
+        return function(*args)
+
+    finally:
+        hook.persisted_metadata = None
+
+
+def prepare_metadata_for_build_wheel(metadata_directory, config_settings=None):
+    return _with_persisted_metadata(metadata_directory, _orig.prepare_metadata_for_build_wheel, metadata_directory, config_settings)
+
+
+def build_wheel(wheel_directory, config_settings=None, metadata_directory=None):
+    return _with_persisted_metadata(metadata_directory, _orig.build_wheel, wheel_directory, config_settings, metadata_directory)
+
+
+if hasattr(_orig, "build_editable"):  # pragma: no cover, setuptools >= 64
+    from setuptools.build_meta import get_requires_for_build_editable  # noqa: F401
+
+    def prepare_metadata_for_build_editable(metadata_directory, config_settings=None):
+        return _with_persisted_metadata(metadata_directory, _orig.prepare_metadata_for_build_editable, metadata_directory, config_settings)
+
+    def build_editable(wheel_directory, config_settings=None, metadata_directory=None):
+        return _with_persisted_metadata(metadata_directory, _orig.build_editable, wheel_directory, config_settings, metadata_directory)
@@ -0,0 +1,332 @@
+"""
+Optional cache of computed results, shared across processes (and projects) on the same machine.
+
+Enabled by pointing env var SETUPMETA_CACHE_DIR to a folder. Entries are content-addressed (keyed by a hash of their inputs),
+so they never need to be invalidated: the least recently used ones get evicted when total size exceeds SETUPMETA_CACHE_SIZE.
+"""
+
+import hashlib
+import json
+import os
+
+import setupmeta
+
+try:
+    basestring
+
+except NameError:
+    basestring = str
+
+
+CACHE_DIR_ENV = "SETUPMETA_CACHE_DIR"  # Env var pointing to cache folder, no caching is done if not set
+CACHE_SIZE_ENV = "SETUPMETA_CACHE_SIZE"  # Env var allowing to customize max total size of cache (in bytes)
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+EVICTION_TARGET = 0.8  # When evicting, cache is trimmed down to this fraction of its max size
+LOCK_FILE = ".lock"
+_CODE_KEY = None  # type: str # Identifies the setupmeta code in use (entries computed by another version of setupmeta are not reused)
+
+
+def content_key(*parts):
+    """
+    :param parts: Inputs to hash (str, bytes, or anything json serializable)
+    :return str: Hex digest identifying given 'parts'
+    """
+    h = hashlib.sha1()
+    for part in parts:
+        if not isinstance(part, bytes):
+            if not isinstance(part, basestring):
+                part = json.dumps(part, sort_keys=True, default=str)
+
+            part = part.encode("utf-8")
+
+        h.update(part)
+        h.update(b"\0")
+
+    return h.hexdigest()
+
+
+def file_key(path):
+    """
+    :param str path: Path to file or folder
+    :return str|None: Hash of file contents (or of folder listing), None if 'path' does not exist
+    """
+    try:
+        if os.path.isdir(path):
+            return content_key(*sorted(os.listdir(path)))
+
+        with open(path, "rb") as fh:
+            return content_key(fh.read())
+
+    except (IOError, OSError):
+        return None
+
+
+def code_key():
+    """
+    :return str: Key identifying the setupmeta code in use (size and mtime of its modules)
+    """
+    global _CODE_KEY
+    if _CODE_KEY is None:
+        folder = os.path.dirname(os.path.abspath(__file__))
+        parts = []
+        for name in sorted(os.listdir(folder)):
+            if name.endswith(".py"):
+                st = os.stat(os.path.join(folder, name))
+                parts.append("%s:%s:%s" % (name, st.st_size, st.st_mtime))
+
+        _CODE_KEY = content_key(*parts)
+
+    return _CODE_KEY
+
+
+class FileLock:
+    """Exclusive lock across processes (via flock), a no-op on platforms without fcntl"""
+
+    def __init__(self, path):
+        """
+        :param str path: Path to lock file
+        """
+        self.path = path
+        self.fh = None
+
+    def __enter__(self):
+        try:
+            import fcntl
+
+        except ImportError:  # pragma: no cover, windows
+            return self
+
+        self.fh = open(self.path, "a")
+        fcntl.flock(self.fh.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *_):
+        if self.fh is not None:
+            import fcntl
+
+            fcntl.flock(self.fh.fileno(), fcntl.LOCK_UN)
+            self.fh.close()
+            self.fh = None
+
+
+class MetaCache:
+    """Content-addressed store of json serializable values, in a folder shared across processes"""
+
+    _by_folder = {}  # type: dict[str, MetaCache]
+
+    def __init__(self, folder, max_size=DEFAULT_MAX_SIZE):
+        """
+        :param str folder: Folder where to store entries
+        :param int max_size: Max total size of cache (in bytes), least recently used entries get evicted past that
+        """
+        self.folder = folder
+        self.max_size = max_size
+        self.written = None  # type: int # Bytes written since last eviction check, None: not checked yet by this process
+
+    def __repr__(self):
+        return setupmeta.short(self.folder)
+
+    @classmethod
+    def current(cls):
+        """
+        :return MetaCache|None: Cache configured via env var SETUPMETA_CACHE_DIR, if any
+        """
+        folder = os.environ.get(CACHE_DIR_ENV)
+        if not folder:
+            return None
+
+        folder = os.path.abspath(os.path.expanduser(folder))
+        max_size = setupmeta.to_int(os.environ.get(CACHE_SIZE_ENV), default=DEFAULT_MAX_SIZE)
+        cache = cls._by_folder.get(folder)
+        if cache is None or cache.max_size != max_size:
+            cache = cls._by_folder[folder] = cls(folder, max_size=max_size)
+
+        return cache
+
+    def entry_path(self, category, key):
+        """
+        :param str category: Category of entry (such as 'license')
+        :param str key: Content key of entry
+        :return str: Path to file holding entry
+        """
+        return os.path.join(self.folder, category, key[:2], "%s.json" % key)
+
+    def get(self, category, key):
+        """
+        :param str category: Category of entry (such as 'license')
+        :param str key: Content key of entry
+        :return dict|None: Stored entry {"value": ...}, if any
+        """
+        path = self.entry_path(category, key)
+        try:
+            with open(path) as fh:
+                entry = json.load(fh)
+
+            os.utime(path, None)  # Mark as recently used
+            setupmeta.trace("cache hit for %s %s", category, key)
+            return entry
+
+        except (IOError, OSError, ValueError):
+            return None
+
+    def put(self, category, key, value):
+        """
+        Store 'value', atomically: concurrent readers see either no entry, or a complete one
+
+        :param str category: Category of entry (such as 'license')
+        :param str key: Content key of entry
+        :param value: Json serializable value to store
+        """
+        path = self.entry_path(category, key)
+        try:
+            folder = os.path.dirname(path)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+
+            temp_path = "%s.%s.tmp" % (path, os.getpid())
+            data = json.dumps({"value": value}, sort_keys=True)
+            with open(temp_path, "w") as fh:
+                fh.write(data)
+
+            with FileLock(os.path.join(self.folder, LOCK_FILE)):
+                os.rename(temp_path, path)
+                if self.written is None or self.written + len(data) > self.max_size // 16:
+                    # Check size on first write, and then every time a significant amount got written
+                    self.evict()
+                    self.written = 0
+
+                else:
+                    self.written += len(data)
+
+        except (IOError, OSError, TypeError, ValueError) as e:
+            setupmeta.trace("can't write cache entry %s: %s", path, e)
+
+    def evict(self):
+        """Delete least recently used entries, if cache exceeds its max size (caller must hold the lock)"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                        entries.append((st.st_mtime, st.st_size, path))
+                        total += st.st_size
+
+                    except OSError:  # pragma: no cover, deleted by another process
+                        pass
+
+        if total > self.max_size:
+            target = self.max_size * EVICTION_TARGET
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+
+                try:
+                    os.unlink(path)
+                    total -= size
+
+                except OSError:  # pragma: no cover, deleted by another process
+                    pass
+
+            setupmeta.trace("evicted cache entries, cache size is now %s", total)
+
+
+def cached(category, key_parts, compute):
+    """
+    :param str category: Category of value (such as 'license')
+    :param list|callable key_parts: Inputs that fully determine the value (or function returning them, None: can't be cached)
+    :param callable compute: Function computing the value (must be json serializable)
+    :return: Cached value if available, freshly computed one otherwise
+    """
+    cache = MetaCache.current()
+    if cache is not None and callable(key_parts):
+        key_parts = key_parts()
+
+    if cache is None or key_parts is None:
+        return compute()
+
+    key = content_key(code_key(), *key_parts)
+    entry = cache.get(category, key)
+    if entry is not None:
+        return entry.get("value")
+
+    value = compute()
+    cache.put(category, key, value)
+    return value
+
+
+def scm_key(project_dir):
+    """
+    :param str project_dir: Project folder
+    :return list|None: State of project's SCM (where HEAD is, tags, whether checkout is dirty), None if it can't be determined
+    """
+    from setupmeta.scm import Git
+    from setupmeta.versioning import project_scm
+
+    scm = project_scm(project_dir)
+    if isinstance(scm, Git):
+        return scm.checkout_state()
+
+    return [scm.__class__.__name__ if scm else None]
+
+
+def cached_definitions(project_dir, attrs, fields, compute):
+    """
+    Computed metadata of a project, keyed by hashes of all the files that auto-fill looked at (whether they contributed or not).
+    A first entry remembers which files were used last time (for given attrs), to be able to determine the key of the second one.
+
+    :param str project_dir: Project folder
+    :param dict attrs: Attributes explicitly passed to setup()
+    :param list(str)|None fields: Fields of interest (None: all fields)
+    :param callable compute: Function computing metadata, returning a setupmeta.model.SetupMeta object
+    :return dict(str, setupmeta.model.Definition): Computed definitions
+    """
+    import warnings
+
+    from setupmeta.model import deserialized_definitions, serialized_definitions
+
+    cache = MetaCache.current()
+    versioning = attrs.get("versioning")
+    if cache is None or (isinstance(versioning, basestring) and "$" in versioning):
+        # Versions referring to env vars can't be cached
+        return compute().definitions
+
+    env_vars = (setupmeta.SCM_DESCRIBE, "SETUPMETA_GIT_DESCRIBE_COMMAND", "PYGRADLE_PROJECT_VERSION")
+    env_vars += (setupmeta.TARGET_ENV, setupmeta.TRUST_PKG_INFO)
+    env = [os.environ.get(name) for name in env_vars]
+    relevant_attrs = dict((k, v) for k, v in attrs.items() if not k.startswith("_"))
+    manifest_key = content_key(code_key(), relevant_attrs, fields, env)
+    scm_state = scm_key(project_dir)
+    if scm_state is None:
+        return compute().definitions
+
+    def metadata_key(paths):
+        return content_key(manifest_key, scm_state, [(path, file_key(os.path.join(project_dir, path))) for path in paths])
+
+    manifest = cache.get("inputs", manifest_key)
+    entry = manifest and cache.get("metadata", metadata_key(manifest["value"]))
+    if entry is None:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            meta = compute()
+
+        messages = [str(w.message) for w in caught]
+        if meta.steps:
+            # Only full auto-fills know all the files they used
+            paths = meta.input_paths()
+            value = {"warnings": messages}
+            value["definitions"] = serialized_definitions(meta.definitions)
+            cache.put("metadata", metadata_key(paths), value)
+            cache.put("inputs", manifest_key, paths)
+
+        for message in messages:
+            setupmeta.warn(message)
+
+        return meta.definitions
+
+    for message in entry["value"]["warnings"]:
+        setupmeta.warn(message)
+
+    return deserialized_definitions(entry["value"]["definitions"])
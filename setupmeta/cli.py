@@ -0,0 +1,370 @@
+"""
+Command line interface, usable via: python -m setupmeta <command> ...
+"""
+
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import stat
+import sys
+import threading
+import time
+import warnings
+
+import setupmeta
+from setupmeta.model import candidate_paths, PSEUDO_FIELDS, queried_value
+from setupmeta.scm import Git
+from setupmeta.versioning import find_scm_root
+
+
+DEFAULT_SOCKET = os.path.join(os.path.expanduser("~"), ".setupmeta.sock")
+
+
+def represented_definitions(result, definitions, fields=None):
+    """
+    :param dict result: Where to add fields and their sources
+    :param dict(str, setupmeta.model.Definition) definitions: Computed definitions
+    :param list(str)|None fields: Fields of interest (default: all setup() fields)
+    """
+    if fields:
+        keys = sorted(key for key in fields if PSEUDO_FIELDS.get(key, key) in definitions)
+
+    else:
+        keys = sorted(key for key in definitions if key in setupmeta.MetaDefs.all_fields)
+
+    result["fields"] = dict((key, queried_value(key, definitions[PSEUDO_FIELDS.get(key, key)].value)) for key in keys)
+    result["sources"] = dict((key, definitions[PSEUDO_FIELDS.get(key, key)].source) for key in keys)
+
+
+def evaluated_project(folder, fields=None):
+    """
+    :param str folder: Project folder (where its setup.py resides)
+    :param list(str)|None fields: Fields of interest (default: all)
+    :return dict: Computed fields, with their sources and timing (json serializable)
+    """
+    started = time.time()
+    result = {"project": folder}
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        try:
+            if not os.path.isfile(os.path.join(folder, "setup.py")):
+                raise setupmeta.UsageError("no setup.py in %s" % folder)
+
+            represented_definitions(result, setupmeta.compute(folder, fields=fields), fields)
+
+        except Exception as e:
+            result["error"] = "%s: %s" % (e.__class__.__name__, e)
+
+    if caught:
+        result["warnings"] = [str(w.message) for w in caught]
+
+    result["elapsed"] = round(time.time() - started, 4)
+    return result
+
+
+class ProjectState:
+    """Computed definitions of a project, kept along with a fingerprint of the inputs they were computed from"""
+
+    def __init__(self, folder):
+        """
+        :param str folder: Project folder (where its setup.py resides)
+        """
+        self.folder = folder
+        self.definitions = None  # type: dict # All computed definitions
+        self.warnings = None  # type: list[str] # Warnings issued while computing definitions
+        self.inputs = []  # type: list[str] # Files and folders the definitions were computed from
+        self.fingerprint = None  # type: tuple # mtimes of self.inputs, and git checkout state
+        scm_root = find_scm_root(folder, ".git")
+        self.git = Git(scm_root) if scm_root else None
+
+    def __repr__(self):
+        return self.folder
+
+    def current_fingerprint(self):
+        """
+        :return tuple: mtimes of all inputs (None for missing ones), and current git checkout state (HEAD, tags, dirty or not)
+        """
+        mtimes = []
+        for path in self.inputs:
+            try:
+                mtimes.append(os.path.getmtime(path))
+
+            except OSError:
+                mtimes.append(None)
+
+        return tuple(mtimes), self.git and self.git.checkout_state()
+
+    def input_paths(self):
+        """
+        :return list(str): Files and folders that our definitions were computed from, or that were looked at (existing or not)
+        """
+        relative_paths = set(candidate_paths(self.folder, self.definitions))
+        for definition in self.definitions.values():
+            for entry in definition.sources:
+                path = entry.source and entry.source.partition(":")[0]
+                if path and os.path.exists(os.path.join(self.folder, path)):
+                    relative_paths.add(path)
+
+        return sorted(set(os.path.join(self.folder, path).rstrip(os.sep) for path in relative_paths))
+
+    def refresh(self):
+        """
+        Recompute definitions, if any of the inputs changed since last time
+
+        :return bool: True if definitions were served from cache (no input changed)
+        """
+        if self.definitions is not None and self.current_fingerprint() == self.fingerprint:
+            return True
+
+        if self.fingerprint is not None:
+            # Files changed: what was cached for the lifetime of this process (found packages, parsed requirements...) may be stale
+            setupmeta.clear_caches()
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            self.definitions = setupmeta.compute(self.folder)
+
+        self.warnings = [str(w.message) for w in caught]
+        self.inputs = self.input_paths()
+        self.fingerprint = self.current_fingerprint()
+        return False
+
+    def query(self, fields=None):
+        """
+        :param list(str)|None fields: Fields of interest (default: all)
+        :return dict: Computed fields, with their sources and timing (json serializable)
+        """
+        started = time.time()
+        result = {"project": self.folder}
+        try:
+            result["cached"] = self.refresh()
+            represented_definitions(result, self.definitions, fields)
+            if self.warnings:
+                result["warnings"] = self.warnings
+
+        except Exception as e:
+            self.definitions = None
+            result["error"] = "%s: %s" % (e.__class__.__name__, e)
+
+        result["elapsed"] = round(time.time() - started, 4)
+        return result
+
+
+class MetaServer:
+    """
+    Answer json queries over a unix socket, keeping computed metadata warm per project.
+    One json request per line: {"project": "<folder>", "fields": ["name", "version"]} (fields are optional),
+    each request gets one json line in response. Send {"stop": true} to stop the server.
+    """
+
+    def __init__(self, socket_path):
+        """
+        :param str socket_path: Path to unix socket to listen on
+        """
+        self.socket_path = socket_path
+        self.projects = {}  # type: dict[str, ProjectState]
+        self.running = False
+        self.lock = threading.Lock()  # Computing metadata isn't thread safe (setupmeta.MetaDefs.project_dir is global)
+
+    def __repr__(self):
+        return "%s (%s projects)" % (self.socket_path, len(self.projects))
+
+    def response(self, line):
+        """
+        :param str line: Json request
+        :return dict: Response to send back
+        """
+        try:
+            request = json.loads(line)
+            if request.get("stop"):
+                self.running = False
+                return {"stopped": True}
+
+            folder = request.get("project")
+            if not folder:
+                raise setupmeta.UsageError("no 'project' specified")
+
+            folder = os.path.abspath(folder)
+            if not os.path.isfile(os.path.join(folder, "setup.py")):
+                raise setupmeta.UsageError("no setup.py in %s" % folder)
+
+            fields = request.get("fields")
+            fields = setupmeta.listify(fields, separator=",") if fields else None
+            with self.lock:
+                project = self.projects.get(folder)
+                if project is None:
+                    project = self.projects[folder] = ProjectState(folder)
+
+                return project.query(fields)
+
+        except Exception as e:
+            return {"error": "%s: %s" % (e.__class__.__name__, e)}
+
+    def handle(self, connection):
+        """Answer all requests sent via 'connection', one json line per request, then close it"""
+        reader = connection.makefile("rb")
+        try:
+            for line in reader:
+                line = setupmeta.decode(line).strip()
+                if line:
+                    response = json.dumps(self.response(line), sort_keys=True, default=str)
+                    connection.sendall(("%s\n" % response).encode("utf-8"))
+                    if not self.running:
+                        return
+
+        except (IOError, OSError) as e:
+            setupmeta.trace("connection lost: %s", e)
+
+        finally:
+            reader.close()
+            connection.close()
+
+    def remove_stale_socket(self):
+        """Remove socket left behind by a previous server, refuse to touch anything that isn't a socket"""
+        import socket
+
+        try:
+            st = os.stat(self.socket_path)
+
+        except OSError:
+            return
+
+        if not stat.S_ISSOCK(st.st_mode):
+            raise setupmeta.UsageError("%s exists and is not a socket" % self.socket_path)
+
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            client.connect(self.socket_path)
+            raise setupmeta.UsageError("a server is already listening on %s" % self.socket_path)
+
+        except socket.error:
+            os.unlink(self.socket_path)
+
+        finally:
+            client.close()
+
+    def serve(self, poll_interval=0.2):
+        """
+        Serve requests until asked to stop, each connection is handled in its own thread
+
+        :param float poll_interval: How often (in seconds) to check whether we've been asked to stop
+        """
+        import select
+        import socket
+
+        self.remove_stale_socket()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(self.socket_path)
+            server.listen(8)
+            self.running = True
+            while self.running:
+                if server in select.select([server], [], [], poll_interval)[0]:
+                    connection, _ = server.accept()
+                    connection.settimeout(None)
+                    thread = threading.Thread(target=self.handle, args=(connection,))
+                    thread.daemon = True
+                    thread.start()
+
+        finally:
+            server.close()
+            os.unlink(self.socket_path)
+
+
+def query(socket_path, project, fields=None):
+    """
+    Query a running 'python -m setupmeta serve' server
+
+    :param str socket_path: Path to server's unix socket
+    :param str project: Project folder
+    :param list(str)|None fields: Fields of interest (default: all)
+    :return dict: Response from server
+    """
+    import socket
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        request = json.dumps({"project": project, "fields": fields})
+        client.sendall(("%s\n" % request).encode("utf-8"))
+        reader = client.makefile("rb")
+        try:
+            return json.loads(setupmeta.decode(reader.readline()))
+
+        finally:
+            reader.close()
+
+    finally:
+        client.close()
+
+
+def cmd_batch(args):
+    """
+    Evaluate many projects, using a pool of worker processes (one interpreter per worker, reused across projects).
+    Outputs one json line per project, in the order projects were given.
+
+    :return int: Number of projects that could not be evaluated
+    """
+    folders = [os.path.abspath(folder) for folder in args.folders]
+    fields = setupmeta.listify(args.query, separator=",") if args.query else None
+    jobs = min(args.jobs or multiprocessing.cpu_count(), len(folders))
+    evaluate = functools.partial(evaluated_project, fields=fields)
+    pool = None
+    if jobs > 1:
+        pool = multiprocessing.Pool(jobs)
+        results = pool.imap(evaluate, folders)
+
+    else:
+        results = (evaluate(folder) for folder in folders)
+
+    failed = 0
+    try:
+        for result in results:
+            if "error" in result:
+                failed += 1
+
+            print(json.dumps(result, sort_keys=True, default=str))
+            sys.stdout.flush()
+
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    return failed
+
+
+def cmd_serve(args):
+    """Keep computed metadata warm, and answer queries over a unix socket"""
+    server = MetaServer(os.path.abspath(args.socket))
+    print("Serving on %s" % server.socket_path)
+    sys.stdout.flush()
+    server.serve()
+
+
+def main(argv=None):
+    """
+    :param list(str)|None argv: Command line arguments (default: sys.argv[1:])
+    :return int: Exit code
+    """
+    parser = argparse.ArgumentParser(prog="python -m setupmeta", description="Compute metadata of projects using setupmeta")
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch = subparsers.add_parser("batch", help="Evaluate many projects in parallel, output one json line per project")
+    batch.add_argument("--jobs", "-j", type=int, default=0, help="Number of worker processes (default: number of CPUs)")
+    batch.add_argument("--query", "-q", help="Comma separated fields to compute (default: all)")
+    batch.add_argument("folders", nargs="+", help="Project folders to evaluate")
+    batch.set_defaults(func=cmd_batch)
+
+    serve = subparsers.add_parser("serve", help="Answer json queries over a unix socket, keeping computed metadata warm per project")
+    serve.add_argument("--socket", "-s", default=DEFAULT_SOCKET, help="Unix socket to listen on (default: %(default)s)")
+    serve.set_defaults(func=cmd_serve)
+
+    args = parser.parse_args(argv)
+    if not getattr(args, "func", None):
+        parser.print_help()
+        return 1
+
+    return 1 if args.func(args) else 0
@@ -3,17 +3,21 @@ Commands contributed by setupmeta
 """
 
 import collections
+import json
 import os
-import shutil
+import sys
 from distutils.command.check import check as check_cmd
 from itertools import chain
 
 import setuptools
 
 import setupmeta
+from setupmeta.model import get_console_scripts, PSEUDO_FIELDS, queried_value
 
 
 flatten = chain.from_iterable
+WATCH_INTERVAL = 1  # Seconds between polls of project files, for 'explain --watch'
+REQS_SNAPSHOT = "build/setupmeta-reqs.json"  # Default location (relative to project) of snapshot of requirements for 'check --diff'
 
 
 def abort(message):
@@ -45,6 +49,8 @@ class CheckCommand(check_cmd):
         ("status", "t", "Show git status recap (useful to get evidence as to why version was dirty during CI jobs)"),
         ("deptree", "d", "Show dependency tree (from currently activated venv, or ./.venv, or ./venv)"),
         ("reqs", "q", "Show how many requirements were auto-abstracted or ignored, if any"),
+        ("diff", None, "Show what changed in requirements since previous 'check --diff' run"),
+        ("snapshot=", None, "Where to keep the snapshot of requirements used by --diff (default: %s)" % REQS_SNAPSHOT),
     ]
 
     def initialize_options(self):
@@ -52,16 +58,21 @@ class CheckCommand(check_cmd):
         self.status = None
         self.deptree = None
         self.reqs = None
+        self.diff = None
+        self.snapshot = None
 
     def run(self):
         if not self.setupmeta:
             return check_cmd.run(self)
 
-        if count(self.restructuredtext, self.status, self.deptree, self.reqs) == 0:
+        if count(self.restructuredtext, self.status, self.deptree, self.reqs, self.diff) == 0:
             self.status = 1
             self.reqs = 1
 
-        if self.reqs:
+        if self.diff:
+            self._show_requirements_changes()
+
+        elif self.reqs:
             self._show_requirements_synopsis()
 
         if self.status:
@@ -89,6 +100,49 @@ class CheckCommand(check_cmd):
 
                 print(message)
 
+    def _show_requirements_changes(self):
+        """Show what changed in parsed requirements since last snapshot"""
+        reqs = self.setupmeta.requirements
+        path = setupmeta.project_path(self.snapshot or REQS_SNAPSHOT)
+        previous = None
+        if os.path.exists(path):
+            try:
+                with open(path) as fh:
+                    previous = json.load(fh)
+
+            except (IOError, ValueError):
+                previous = None
+
+        fields = {}
+        if reqs:
+            for key in ("install_requires", "tests_require"):
+                req = getattr(reqs, key)
+                if req:
+                    fields[key] = req.snapshot()
+
+        if previous is None:
+            print("[setupmeta] no previous snapshot of requirements, saving one in %s" % setupmeta.relative_path(path))
+
+        else:
+            changed = False
+            for key in ("install_requires", "tests_require"):
+                lines = requirements_changes(previous.get(key, {}), fields.get(key, {}))
+                if lines:
+                    changed = True
+                    print("[setupmeta] %s changes:" % key)
+                    for line in lines:
+                        print("  %s" % line)
+
+            if not changed:
+                print("[setupmeta] requirements unchanged")
+
+        folder = os.path.dirname(path)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        with open(path, "w") as fh:
+            json.dump(fields, fh, indent=1, sort_keys=True)
+
     def _show_git_status(self):
         if self.setupmeta.versioning:
             scm = self.setupmeta.versioning.scm
@@ -98,6 +152,28 @@ class CheckCommand(check_cmd):
                     print("Pending changes:\n%s" % diff)
 
 
+def requirements_changes(previous, current):
+    """
+    :param dict previous: Previous RequirementsFile.snapshot()
+    :param dict current: Current RequirementsFile.snapshot()
+    :return list(str): Human readable list of changes
+    """
+    result = []
+    for key in sorted(set(previous) | set(current)):
+        old = previous.get(key)
+        new = current.get(key)
+        if old is None:
+            result.append("+ %s (%s, from %s)" % (new[1], new[0], new[2]))
+
+        elif new is None:
+            result.append("- %s (removed, was %s)" % (old[1], old[0]))
+
+        elif old[:2] != new[:2]:
+            result.append("~ %s (%s, from %s), was: %s (%s)" % (new[1], new[0], new[2], old[1], old[0]))
+
+    return result
+
+
 @MetaCommand
 class VersionCommand(setuptools.Command):
     """show/bump version managed by setupmeta"""
@@ -144,6 +220,7 @@ class ExplainCommand(setuptools.Command):
         ("expand", "x", "show expanded setup.py, as it would be without setupmeta"),
         ("recommend", "r", "show more recommendations"),
         ("chars=", "c", "max chars to show"),
+        ("watch", "w", "keep watching project files, and show report again when they change"),
     ]
 
     def initialize_options(self):
@@ -151,6 +228,7 @@ class ExplainCommand(setuptools.Command):
         self.expand = False
         self.recommend = False
         self.chars = setupmeta.Console.columns()
+        self.watch = False
 
     def check_recommend(self, key, hint=None):
         if key not in self.setupmeta.definitions:
@@ -173,17 +251,31 @@ class ExplainCommand(setuptools.Command):
         content = "None,   # no auto-fill"
         names = []
         source_descriptions = []
+        dropped = []
         if requirements:
             for req_entry in requirements.reqs:
-                if req_entry.requirement and not req_entry.is_ignored and req_entry.requirement not in names:
-                    names.append(req_entry.requirement)
-                    source_descriptions.append(req_entry.source_description)
+                name = requirements.constrained(req_entry) if req_entry.requirement else None
+                if name and not req_entry.is_ignored and name not in names:
+                    description = req_entry.source_description
+                    constraint = requirements.constraint_for(req_entry)
+                    if constraint is not None:
+                        description += ", constrained by %s:%s" % (constraint.source, constraint.line_number)
+
+                    names.append(name)
+                    source_descriptions.append(description)
+                    dropped.append(req_entry in requirements.dropped)
 
         if names:
             longest_name = max(len(name) for name in names) + 5
             content = []
             for i, name in enumerate(names):
-                content.append(self.represented_req(name, source_descriptions[i], longest_name))
+                if dropped[i]:
+                    # Shown for reference only, marker doesn't apply to target environment stated via SETUPMETA_TARGET_ENV
+                    description = "%s, dropped for target environment" % source_descriptions[i]
+                    content.append("# %s" % self.represented_req(name, description, longest_name))
+
+                else:
+                    content.append(self.represented_req(name, source_descriptions[i], longest_name))
 
             content = "[\n        %s\n    ]," % "\n        ".join(content).strip()
 
@@ -284,7 +376,39 @@ class ExplainCommand(setuptools.Command):
             return self.show_dependencies()
 
         self.chars = setupmeta.to_int(self.chars, default=setupmeta.Console.columns())
+        self.show_explanation()
+        if self.watch:
+            self.watch_changes()
+
+    def watch_changes(self, interval=WATCH_INTERVAL):
+        """
+        Poll inputs of each auto-fill step (via os.stat, no extra dependency needed),
+        re-run only the steps affected by a change (and the ones after them), then show report again
+
+        :param float interval: Seconds to wait between polls
+        """
+        import time
 
+        meta = self.setupmeta
+        if not meta.watched:
+            # Inputs were not recorded during setup(), record them now
+            meta.watched = True
+            meta.run_auto_fill(0)
+
+        try:
+            while True:
+                sys.stdout.flush()
+                time.sleep(interval)
+                start = meta.first_outdated_step()
+                if start is not None:
+                    print("\n--- Inputs of %s changed, re-running %s auto-fill steps\n" % (meta.steps[start].name, len(meta.steps) - start))
+                    meta.run_auto_fill(start)
+                    self.show_explanation()
+
+        except KeyboardInterrupt:
+            pass
+
+    def show_explanation(self):
         definitions = self.setupmeta.definitions
         self.check_recommend("name")
         self.check_recommend("version", "you can use setupmeta's versioning='...'")
@@ -347,29 +471,43 @@ class EntryPointsCommand(setuptools.Command):
                 print(line)
 
 
-def get_console_scripts(entry_points):
-    """pygradle's 'entrypoints' are misnamed: they really mean 'consolescripts'"""
-    if not entry_points:
-        return None
+@MetaCommand
+class QueryCommand(setuptools.Command):
+    """Show several metadata fields at once (as json, if desired)"""
 
-    if isinstance(entry_points, dict):
-        return entry_points.get("console_scripts")
+    user_options = [
+        ("query=", None, "comma separated fields to show (default: all), 'entrypoints' shows console scripts"),
+        ("json", "j", "show output as json"),
+    ]
 
-    if isinstance(entry_points, list):
-        result = []
-        in_console_scripts = False
-        for line in entry_points:
-            line = line.strip()
-            if line and line.startswith("["):
-                in_console_scripts = "console_scripts" in line
-                continue
+    def initialize_options(self):
+        self.query = None
+        self.json = False
 
-            if in_console_scripts:
-                result.append(line)
+    def field_value(self, key):
+        """
+        :param str key: Field to get value for
+        :return: Value of field 'key'
+        """
+        return queried_value(key, self.setupmeta.value(PSEUDO_FIELDS.get(key, key)))
 
-        return result
+    def run(self):
+        if not self.setupmeta:
+            return
+
+        if self.query:
+            keys = setupmeta.listify(self.query, separator=",")
 
-    return get_console_scripts(entry_points.split("\n"))
+        else:
+            keys = sorted(key for key in self.setupmeta.to_dict() if key in setupmeta.MetaDefs.all_fields)
+
+        result = collections.OrderedDict((key, self.field_value(key)) for key in keys)
+        if self.json:
+            print(json.dumps(result, indent=2, default=str))
+            return
+
+        for key, value in result.items():
+            print("%s: %s" % (key, setupmeta.stringify(value)))
 
 
 @MetaCommand
@@ -386,6 +524,8 @@ class CleanCommand(setuptools.Command):
 
     def delete(self, full_path):
         if os.path.isdir(full_path):
+            import shutil
+
             shutil.rmtree(full_path)
             print("deleted %s" % setupmeta.relative_path(full_path))
 
@@ -444,7 +584,8 @@ def _show_dependencies(definitions):
     """
     Conveniently  get dependency tree via ./setup.py check --dep, similar to https://pypi.org/project/pipdeptree
     """
-    if setupmeta.pkg_resources is None or not hasattr(setupmeta.pkg_resources, "WorkingSet"):
+    pkg_resources = setupmeta.get_pkg_resources()
+    if pkg_resources is None or not hasattr(pkg_resources, "WorkingSet"):
         setupmeta.warn("pkg_resources is not available, can't show dependencies")
         return 1
 
@@ -458,7 +599,7 @@ def _show_dependencies(definitions):
         setupmeta.warn("Could not find 'site-packages' subfolder in '%s'" % venv)
         return 1
 
-    tree = DepTree(setupmeta.pkg_resources.WorkingSet(entries), definitions)
+    tree = DepTree(pkg_resources.WorkingSet(entries), definitions)
     print(tree.rendered())
     return len(tree.conflicts) + len(tree.cycles)
 
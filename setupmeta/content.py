@@ -2,7 +2,6 @@
 Functionality related to interacting with project and distutils content
 """
 
-import glob
 import os
 import re
 
@@ -12,6 +11,12 @@ import setupmeta
 # Recognized README tokens
 RE_README_TOKEN = re.compile(r"(.?)\.\. \[\[([a-z]+) (.+)\]\](.)?")
 
+# Folders that can't be python packages (or that we never want to auto-package), and can be expensive to walk
+PRUNED_FOLDERS = {"__pycache__", "node_modules", "site-packages", "venv"}
+ROOT_PRUNED_FOLDERS = {"build", "dist"}  # Pruned only at top level (a sub-package can legitimately be called 'build')
+
+_PACKAGES_CACHE = {}  # type: dict[str, tuple] # Packages found per folder, with mtimes of all folders examined
+
 
 def load_contents(relative_path, limit=0):
     """Return contents of file with 'relative_path'
@@ -93,12 +98,13 @@ def resolved_paths(relative_paths):
     :return str|None: Contents of the first non-empty file found
     """
     candidates = []
+    files = setupmeta.project_files()
     for path in relative_paths:
         # De-dupe and respect order (especially for globbed paths)
         if "*" in path:
-            full_path = setupmeta.project_path(path)
-            for expanded in sorted(glob.glob(full_path)):
-                relative_path = os.path.basename(expanded)
+            folder, pattern = os.path.split(path)
+            for expanded in files.glob(pattern, folder=folder):
+                relative_path = os.path.join(folder, expanded)
                 if relative_path not in candidates:
                     candidates.append(relative_path)
             continue
@@ -122,3 +128,50 @@ def find_contents(relative_paths, loader=None, limit=0):
         if contents:
             return contents, relative_path
     return None, None
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+
+    except OSError:
+        return None
+
+
+def _scan_packages(folder, prefix, examined, packages):
+    """
+    :param str folder: Folder to scan
+    :param str prefix: Package name prefix (for sub-packages)
+    :param list examined: Accumulates (path, mtime) of each folder looked at
+    :param list packages: Accumulates packages found
+    """
+    for name, is_dir in setupmeta.scanned_folder(folder) or []:
+        if is_dir and "." not in name and name not in PRUNED_FOLDERS and (prefix or name not in ROOT_PRUNED_FOLDERS):
+            path = os.path.join(folder, name)
+            examined.append((path, _mtime(path)))
+            if os.path.isfile(os.path.join(path, "__init__.py")):
+                package = prefix + name
+                packages.append(package)
+                _scan_packages(path, package + ".", examined, packages)
+
+
+def find_packages(folder):
+    """Same as setuptools.find_packages(where=folder), but without descending into known heavy folders (such as node_modules)
+
+    Results are cached, and reused as long as the modification time of the folders examined did not change
+
+    :param str folder: Folder to scan for python packages
+    :return list(str): Packages found
+    """
+    cached = _PACKAGES_CACHE.get(folder)
+    if cached:
+        examined, packages = cached
+        if all(_mtime(path) == mtime for path, mtime in examined):
+            return list(packages)
+
+    examined = [(folder, _mtime(folder))]
+    packages = []
+    _scan_packages(folder, "", examined, packages)
+    setupmeta.trace("found %s packages in %s (%s folders examined)", len(packages), folder, len(examined), category="content")
+    _PACKAGES_CACHE[folder] = (examined, packages)
+    return list(packages)
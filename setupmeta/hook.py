@@ -8,6 +8,9 @@ import warnings
 
 from setupmeta.model import MetaDefs, SetupMeta
 
+# Json file where finalized definitions are shared between the steps of a PEP 517 build (set by setupmeta.build_meta)
+persisted_metadata = None
+
 
 def finalize_dist(dist, setup_requires=None):
     """
@@ -46,8 +49,13 @@ def parse_command_line(dist, *args, **kwargs):  # noqa: E302 (keep override clos
     before any commands are run. We then call `parse_command_line` to continue
     normal execution.
     """
-    dist._setupmeta.finalize(dist)
-    MetaDefs.fill_dist(dist, dist._setupmeta.to_dict())
+    meta = dist._setupmeta
+    if not persisted_metadata or not meta.load_definitions(dist, persisted_metadata):
+        meta.finalize(dist)
+        if persisted_metadata:
+            meta.save_definitions(persisted_metadata)
+
+    MetaDefs.fill_dist(dist, meta.to_dict())
 
     return parse_command_line_orig(dist, *args, **kwargs)
 
@@ -2,17 +2,18 @@
 Model of our view on how setup.py + files in a project can come together
 """
 
-import inspect
+import fnmatch
 import io
 import os
 import re
 import sys
+import time
 
-import setuptools
-
-from setupmeta import current_folder, get_words, listify, MetaDefs, PKGID, project_path, readlines, relative_path
-from setupmeta import Requirements, requirements_from_file, short, trace, warn
-from setupmeta.content import find_contents, load_contents, load_list, load_readme, resolved_paths
+from setupmeta import decode, get_words, listify, MetaDefs, PKGID, project_files, project_path, ProjectFiles, readlines, relative_path
+from setupmeta import Requirements, REQUIREMENTS_FILES, requirements_from_files, short, trace, tracing, VERSION_FILE, warn
+from setupmeta import TESTS_REQUIREMENTS_FILES, TRUST_PKG_INFO
+from setupmeta.cache import cached
+from setupmeta.content import find_contents, find_packages, load_contents, load_list, load_readme, resolved_paths
 from setupmeta.license import determined_license
 from setupmeta.versioning import project_scm, Versioning
 
@@ -22,11 +23,32 @@ try:
 except NameError:
     basestring = str
 
+try:
+    from sys import intern
+
+except ImportError:  # pragma: no cover, python2: 'intern' is a builtin
+    pass
+
 
 # Used to mark which key/values were provided explicitly in setup.py
 EXPLICIT = "explicit"
 CLASSIFIERS = "classifiers.txt"
 READMES = ["README.rst", "README.md", "README*"]
+LICENSES = ["LICENSE*"]
+MODULES_WITH_DEFINITIONS = ["__about__.py", "__version__.py", "__init__.py"]  # Modules of top-level packages scanned for definitions
+
+# Files and folders always looked at by auto-fill, whether they exist or not ("": project folder, listing changes when files are added)
+PROJECT_INPUTS = ["", "src", "tests", "setup.py", "setup.cfg", "PKG-INFO", "MANIFEST.in", VERSION_FILE, CLASSIFIERS, "entry_points.ini"]
+EGG_INFO_PRUNED_FOLDERS = {"__pycache__", "build", "dist"}  # Folders not searched for .egg-info (in addition to dot-folders)
+_EGG_INFO_LOCATIONS = {}  # type: dict[tuple, str] # Cached location of .egg-info folders, per (project folder, name)
+SHARED_VALUE_MIN_SIZE = 512  # Text values this large are shared between definition entries (see shared_value())
+SHARED_VALUES_MAX = 256  # Max number of large values kept shared at any given time
+_SHARED_VALUES = {}  # type: dict[str, str] # Large text values seen so far, shared by content (emptied after each compute())
+
+# Fields that can be determined without scanning project's modules, see SetupMeta.wants_modules
+STANDALONE_FIELDS = {"dependency_links", "entry_points", "install_requires", "name", "tests_require"}
+PSEUDO_FIELDS = {"entrypoints": "entry_points"}  # Fields that can be queried via 'meta' command, but aren't setup() keywords
+GLOBAL_OPTIONS = {"-q", "--quiet", "-v", "--verbose"}  # Global setup.py options that can precede commands
 
 # Accept reasonable variations of name + some separator + email
 RE_EMAIL = re.compile(r"(.+)[\s<>()\[\],:;]+([^@]+@[a-zA-Z0-9._-]+)")
@@ -34,6 +56,11 @@ RE_EMAIL = re.compile(r"(.+)[\s<>()\[\],:;]+([^@]+@[a-zA-Z0-9._-]+)")
 # Finds simple values of the form: __author__ = 'Someone'
 RE_PY_VALUE = re.compile(r'^__([a-z_]+)__\s*=\s*u?[\'"](.+?)[\'"]\s*(#.+)?$')
 
+# Top-level lines starting with one of these mark the end of a module's header (where __author__ etc are defined)
+HEADER_END_MARKERS = ("def ", "class ", "async def ", "@", "if __name__")
+HEADER_MAX_LINES = 2000  # Don't look past this many lines, even if no function or class was seen (generated modules)
+READ_CHUNK_SIZE = 16384  # Size hint used to read modules in bulk
+
 # Finds simple docstring entries like: author: Zoran Simic
 RE_DOC_VALUE = re.compile(r"^([a-z_]+)\s*[:=]\s*(.+?)(\s*#.+)?$")
 
@@ -44,6 +71,55 @@ RE_PKG_KEY_VALUE = re.compile(r"^(%s):\s?(.*)$" % PKGID)
 RE_DESCRIPTION = re.compile(r"^[\W\s]*((([\w\-]+)\s*[:-])?\s*(.+))$", re.IGNORECASE)
 
 
+def get_console_scripts(entry_points):
+    """pygradle's 'entrypoints' are misnamed: they really mean 'consolescripts'"""
+    if not entry_points:
+        return None
+
+    if isinstance(entry_points, dict):
+        return entry_points.get("console_scripts")
+
+    if isinstance(entry_points, list):
+        result = []
+        in_console_scripts = False
+        for line in entry_points:
+            line = line.strip()
+            if line and line.startswith("["):
+                in_console_scripts = "console_scripts" in line
+                continue
+
+            if in_console_scripts:
+                result.append(line)
+
+        return result
+
+    return get_console_scripts(entry_points.split("\n"))
+
+
+def queried_value(key, value):
+    """
+    :param str key: Queried field, either a setup() keyword or one of PSEUDO_FIELDS
+    :param value: Value of corresponding setup() keyword
+    :return: Value to report for 'key'
+    """
+    if key == "entrypoints":
+        console_scripts = get_console_scripts(value)
+        if console_scripts and not isinstance(console_scripts, list):
+            console_scripts = [line.strip() for line in console_scripts.splitlines() if line.strip()]
+
+        return console_scripts
+
+    return value
+
+
+def is_file_reference(value):
+    """
+    :param value: Value given to setup() for a requirements field (such as 'install_requires')
+    :return bool: True if 'value' refers to a requirements file, as in "@requirements.txt"
+    """
+    return isinstance(value, basestring) and value.startswith("@")
+
+
 def is_setup_py_path(path):
     """ Is 'path' pointing to a setup.py module? """
     if path:
@@ -51,6 +127,81 @@ def is_setup_py_path(path):
         return os.path.basename(path).startswith("setup.py")
 
 
+def shared_value(value):
+    """
+    :param value: Value of a definition entry
+    :return: Same value, large texts seen before (such as a long_description from both PKG-INFO and README) are held only once
+    """
+    if isinstance(value, basestring) and len(value) >= SHARED_VALUE_MIN_SIZE:
+        shared = _SHARED_VALUES.get(value)
+        if shared is not None:
+            return shared
+
+        if len(_SHARED_VALUES) >= SHARED_VALUES_MAX:
+            _SHARED_VALUES.clear()
+
+        _SHARED_VALUES[value] = value
+
+    return value
+
+
+def interned(source):
+    """
+    :param str|None source: Source of a definition entry
+    :return str|None: Interned 'source' (there are only a handful of distinct sources, repeated across all definitions)
+    """
+    if isinstance(source, str):
+        return intern(source)
+
+    return source
+
+
+def requested_fields(argv):
+    """
+    Fields requested via command line, when we can tell (for example: 'setup.py --name' or 'setup.py meta --query name,version')
+
+    :param list(str) argv: Command line arguments
+    :return set(str)|None: Requested fields, None means all fields are needed
+    """
+    args = [arg for arg in argv[1:] if arg not in GLOBAL_OPTIONS]
+    if args[:1] == ["--name"]:
+        return {"name"}
+
+    if args[:1] != ["meta"]:
+        return None
+
+    fields = None
+    args = args[1:]
+    while args:
+        arg = args.pop(0)
+        if arg in ("--json", "-j"):
+            continue
+
+        if arg == "--query" and args:
+            value = args.pop(0)
+
+        elif arg.startswith("--query="):
+            value = arg[8:]
+
+        else:
+            # Some other command or option: we can't tell which fields are going to be needed
+            return None
+
+        fields = fields or set()
+        fields.update(PSEUDO_FIELDS.get(key, key) for key in listify(value, separator=","))
+
+    return fields
+
+
+def watch_requested(argv):
+    """
+    :param list(str) argv: Command line arguments
+    :return bool: True if command line asks to watch project for changes (for example: 'setup.py explain --watch')
+    """
+    args = [arg for arg in argv[1:] if arg not in GLOBAL_OPTIONS]
+    return "explain" in args and any(arg in ("--watch", "-w") for arg in args)
+
+
 def content_type_from_filename(filename):
     """Determined content type from 'filename'"""
     if filename:
@@ -61,9 +212,11 @@ def content_type_from_filename(filename):
     return None
 
 
-class DefinitionEntry:
+class DefinitionEntry(object):
     """ Record of where a definition was found and where it came from """
 
+    __slots__ = ("key", "value", "source")
+
     def __init__(self, key, value, source):
         """
         :param str key: Key (for setuptools.setup()) being defined
@@ -71,8 +224,8 @@ class DefinitionEntry:
         :param str source: Source where this definition entry was found
         """
         self.key = key
-        self.value = value
-        self.source = source
+        self.value = shared_value(value)
+        self.source = interned(source)
 
     def __repr__(self):
         return "%s=%s from %s" % (self.key, short(self.value), self.source)
@@ -86,6 +239,8 @@ class DefinitionEntry:
 class Definition(object):
     """ Record definitions for a given key, and where they were found """
 
+    __slots__ = ("key", "value", "sources")
+
     def __init__(self, key):
         """
         :param str key: Key being defined
@@ -130,7 +285,7 @@ class Definition(object):
         for entry in sources:
             if not self.value and entry.value:
                 self.value = entry.value
-                trace("[-- %s] %s=%s" % (entry.source, self.key, entry.value))
+                trace("[-- %s] %s=%s", entry.source, self.key, entry.value)
             self.sources.append(entry)
 
     def add(self, value, source, override=False):
@@ -142,21 +297,180 @@ class Definition(object):
         if isinstance(source, list):
             self.merge_sources(source)
             return
-        if override or not self.value:
-            self.value = value
         entry = DefinitionEntry(self.key, value, source)
+        if override or not self.value:
+            self.value = entry.value
         if override:
             self.sources.insert(0, entry)
-            trace("[<- %s] %s=%s" % (source, self.key, short(value)))
+            trace("[<- %s] %s=%s", source, self.key, value, shorten=True)
         else:
             self.sources.append(entry)
-            trace("[-> %s] %s=%s" % (source, self.key, short(value)))
+            trace("[-> %s] %s=%s", source, self.key, value, shorten=True)
 
     @property
     def is_meaningful(self):
         """ Should this definition make it to the final setup attrs? """
         return self.value is not None or self.is_explicit
 
+    def copy(self):
+        """Copy of this definition, which can be added to without affecting this one"""
+        result = Definition(self.key)
+        result.value = self.value
+        result.sources = list(self.sources)
+        return result
+
+
+def serialized_definitions(definitions):
+    """
+    :param dict(str, Definition) definitions: Definitions to represent
+    :return list: Json serializable representation of 'definitions' (values must be json serializable)
+    """
+    return [[d.key, d.value, [[e.value, e.source] for e in d.sources]] for d in definitions.values()]
+
+
+def deserialized_definitions(data):
+    """
+    :param list data: Definitions, as represented by serialized_definitions()
+    :return dict(str, Definition): Corresponding definitions
+    """
+    result = {}
+    for key, value, sources in data:
+        definition = result[key] = Definition(key)
+        definition.value = value
+        definition.sources = [DefinitionEntry(key, v, source) for v, source in sources]
+
+    return result
+
+
+def file_mtime(path):
+    """
+    :param str path: Path to file or folder
+    :return float|None: Modification time of 'path', None if it does not exist
+    """
+    try:
+        return os.path.getmtime(path)
+
+    except OSError:
+        return None
+
+
+def module_candidates(packages, py_modules):
+    """
+    :param list(str)|None packages: Project's packages
+    :param list(str)|None py_modules: Project's top-level modules
+    :return list(str): Paths (relative to project) of modules scanned for definitions (such as __about__.py), in order of priority
+    """
+    paths = ["%s.py" % py_module for py_module in py_modules or ()]
+    for package in packages or ():
+        if package and "." not in package:
+            # Look at top level modules only
+            for folder in (package, os.path.join("src", package)):
+                paths.extend(os.path.join(folder, name) for name in MODULES_WITH_DEFINITIONS)
+
+    return paths
+
+
+def package_folders(definitions):
+    """
+    :param dict(str, Definition) definitions: Definitions computed for project
+    :return list(str): Folders (relative to project) of packages, if any
+    """
+    packages = definitions.get("packages")
+    packages = packages and packages.value
+    if packages and isinstance(packages, list):
+        package_dir = definitions.get("package_dir")
+        package_dir = package_dir and package_dir.value
+        base = package_dir.get("", "") if isinstance(package_dir, dict) else ""
+        return [os.path.join(base, *package.split(".")) for package in packages]
+
+    return []
+
+
+def candidate_paths(project_dir, definitions):
+    """
+    :param str project_dir: Project folder
+    :param dict(str, Definition) definitions: Definitions computed for project
+    :return list(str): Paths (relative to project) of all files and folders auto-fill looks at, whether they exist or not
+    """
+    packages = definitions.get("packages")
+    py_modules = definitions.get("py_modules")
+    paths = set(PROJECT_INPUTS + REQUIREMENTS_FILES + TESTS_REQUIREMENTS_FILES)
+    paths.update(module_candidates(packages and packages.value, py_modules and py_modules.value))
+    paths.update(package_folders(definitions))
+    try:
+        names = os.listdir(project_dir)
+
+    except OSError:
+        names = []
+
+    for pattern in READMES + LICENSES:
+        paths.update(fnmatch.filter(names, pattern))
+
+    return sorted(paths)
+
+
+class AutoFillStep(object):
+    """ Record of an auto-fill step that ran: definitions as they were before it, and which files it looked at """
+
+    __slots__ = ("function", "snapshot", "inputs", "state", "fingerprint")
+
+    def __init__(self, function, definitions, inputs, state=None):
+        """
+        :param callable function: Function performing this step
+        :param dict(str, Definition)|None definitions: Definitions as they are before this step runs (None: don't keep a snapshot)
+        :param list(str) inputs: Paths (relative to project) this step looks at, even if they don't exist
+        :param callable|None state: Function returning state of other inputs (such as git's HEAD), if any
+        """
+        self.function = function
+        self.snapshot = definitions and dict((key, definition.copy()) for key, definition in definitions.items())
+        self.inputs = inputs
+        self.state = state
+        self.fingerprint = None
+
+    def __repr__(self):
+        return "%s (%s inputs)" % (self.name, len(self.inputs))
+
+    @property
+    def name(self):
+        return self.function.__name__
+
+    def current_fingerprint(self):
+        """
+        :return tuple: mtimes of all inputs (None for missing ones), and current state of other inputs
+        """
+        return tuple(file_mtime(project_path(path)) for path in self.inputs), self.state and self.state()
+
+    def record_inputs(self, definitions, scanned=()):
+        """
+        Add the files that definitions auto-filled by this step came from to self.inputs, and take current fingerprint
+
+        :param dict(str, Definition)|None definitions: Definitions as they are after this step ran (None: not watching for changes)
+        :param list(str) scanned: Paths (relative to project) this step looked at, whether they exist or not
+        """
+        paths = set(self.inputs)
+        paths.update(scanned)
+        if definitions is not None and self.snapshot is not None:
+            files = project_files()
+            for definition in definitions.values():
+                previous = self.snapshot.get(definition.key)
+                known = set(id(entry) for entry in previous.sources) if previous else ()
+                for entry in definition.sources:
+                    if entry.source and id(entry) not in known:
+                        # Sources like 'explicit' or 'auto-fill' aren't files
+                        path = entry.source.partition(":")[0]
+                        if path and files.is_file(path):
+                            paths.add(path)
+
+        self.inputs = sorted(paths)
+        if definitions is not None:
+            self.fingerprint = self.current_fingerprint()
+
+    def restored_definitions(self):
+        """
+        :return dict(str, Definition): Definitions as they were before this step ran
+        """
+        return dict((key, definition.copy()) for key, definition in self.snapshot.items())
+
 
 class Settings:
     """ Collection of key/value pairs with info on where they came from """
@@ -214,34 +528,46 @@ class SimpleModule(Settings):
         Settings.__init__(self)
         self.relative_path = os.path.join(*relative_paths)
         self.full_path = project_path(*relative_paths)
-        self.exists = os.path.isfile(self.full_path)
+        self.exists = project_files().is_file(self.full_path)
         if self.exists:
             with io.open(self.full_path, "rt") as fh:
-                docstring_marker = None
-                docstring_start = None
-                docstring = []
-                line_number = 0
-                for line in fh:
-                    line_number += 1
-                    line = line.rstrip()
-                    if docstring_marker:
-                        if line.endswith(docstring_marker):
-                            docstring_marker = None
-                            if docstring:
-                                self.scan_docstring(docstring, line_number=docstring_start - 1)
-                        else:
-                            docstring.append(line)
-                        continue
-                    if line.startswith('"""') or line.startswith("'''"):
-                        docstring_marker = line[:3]
-                        if len(line) > 3 and line.endswith(docstring_marker):
-                            # Single docstring line edge case
-                            docstring_marker = None
-                            continue
-                        docstring_start = line_number
-                        docstring.append(line[3:])
+                self.scan_header(fh)
+
+    def scan_header(self, fh):
+        """
+        Scan module header (docstring and top-level __dunder__ assignments) for definitions.
+        Scanning stops at the first top-level function or class definition (or after HEADER_MAX_LINES), lines are read in bulk.
+        """
+        docstring_marker = None
+        docstring_start = None
+        docstring = []
+        line_number = 0
+        for lines in iter(lambda: fh.readlines(READ_CHUNK_SIZE), []):
+            for line in lines:
+                line_number += 1
+                line = line.rstrip()
+                if docstring_marker:
+                    if line.endswith(docstring_marker):
+                        docstring_marker = None
+                        if docstring:
+                            self.scan_docstring(docstring, line_number=docstring_start - 1)
+                    else:
+                        docstring.append(line)
+                    continue
+                if line.startswith('"""') or line.startswith("'''"):
+                    docstring_marker = line[:3]
+                    if len(line) > 3 and line.endswith(docstring_marker):
+                        # Single docstring line edge case
+                        docstring_marker = None
                         continue
+                    docstring_start = line_number
+                    docstring.append(line[3:])
+                    continue
+                if line.startswith("__"):
                     self.scan_line(line, RE_PY_VALUE, line_number)
+                elif line.startswith(HEADER_END_MARKERS) or line_number >= HEADER_MAX_LINES:
+                    trace("stopped scanning %s at line %s", self.relative_path, line_number, category="content")
+                    return
 
     def add_pair(self, key, value, line, **kwargs):
         if key and value:
@@ -342,7 +668,7 @@ class PackageInfo:
         "home_page": "url",
         "summary": "description",
     }
-    _list_types = {"classifiers", "long_description"}
+    _list_types = {"classifiers"}
 
     def __init__(self, root):
         self.path = os.path.join(root, "PKG-INFO")
@@ -351,61 +677,162 @@ class PackageInfo:
         self.dependency_links = None
         self.entry_points_txt = None
         self.requires_txt = None
-        lines = readlines(self.path)
-        if not lines:
+        self.sources_txt = None
+        self.egg_info = None
+        self._trusted = None
+        self._description = []  # type: list[list] # First line, start and end offset of each 'Description:' section in PKG-INFO
+        self._long_description = None
+        if not project_files().is_file(self.path) or not self.parse():
             return
 
-        # Parse PKG-INFO when present
+        self.name = self.info.get("name")
+        self.pythonified_name = pythonified_name(self.name)
+        self.load_more_info(root)
+
+    def parse(self):
+        """
+        Parse PKG-INFO in one streaming pass, the (potentially large) description is not kept in memory,
+        only its location in the file is remembered (see self.long_description)
+
+        :return bool: True if PKG-INFO had any content
+        """
         key = None
-        for line_number, line in enumerate(lines, start=1):
-            m = RE_PKG_KEY_VALUE.match(line)
-            if m:
-                key = m.group(1).lower().replace("-", "_")
-                key = self._canonical_names.get(key, key)
-                if key not in MetaDefs.all_fields:
+        offset = 0
+        with io.open(self.path, "rb") as fh:
+            for line_number, raw in enumerate(fh, start=1):
+                offset += len(raw)
+                if key == "long_description" and raw[:1] in (b" ", b"\t", b"\r", b"\n"):
+                    # Indented description line, can't be a key
+                    self._description[-1][2] = offset
                     continue
 
-                value = m.group(2)
-                if key in self._list_types:
-                    if key not in self.info:
-                        self.info[key] = []
+                line = decode(raw).rstrip("\r\n")
+                m = RE_PKG_KEY_VALUE.match(line)
+                if m:
+                    key = m.group(1).lower().replace("-", "_")
+                    key = self._canonical_names.get(key, key)
+                    if key not in MetaDefs.all_fields:
+                        continue
 
-                    self.info[key].append(value)
+                    value = m.group(2)
+                    if key == "long_description":
+                        self._description.append([value, offset, offset])
 
-                else:
-                    self.info[key] = value
+                    elif key in self._list_types:
+                        if key not in self.info:
+                            self.info[key] = []
 
-            elif key in self._list_types:
-                # Indented description applying to previous key
-                self.info[key].append(line[8:].rstrip())
+                        self.info[key].append(value)
 
-            elif line.strip():
-                trace("Unknown format line %s in %s: %s" % (line_number, self.path, line))
+                    else:
+                        self.info[key] = value
 
-        self.name = self.info.get("name")
-        self.pythonified_name = pythonified_name(self.name)
-        self.info["long_description"] = "\n".join(self.info.get("long_description", []))
-        self.load_more_info(root)
+                elif key == "long_description":
+                    self._description[-1][2] = offset
 
-    def load_more_info(self, folder, depth=3):
+                elif key in self._list_types:
+                    # Indented line applying to previous key
+                    self.info[key].append(line[8:].rstrip())
+
+                elif line.strip():
+                    trace("Unknown format line %s in %s: %s", line_number, self.path, line, category="content")
+
+        return offset > 0
+
+    @property
+    def long_description(self):
+        """str|None: Description from PKG-INFO, loaded on first access"""
+        if self._long_description is None and self._description:
+            lines = []
+            with io.open(self.path, "rb") as fh:
+                for first_line, start, end in self._description:
+                    lines.append(first_line)
+                    fh.seek(start)
+                    text = decode(fh.read(end - start))
+                    indented = text.split("\n")
+                    if text.endswith("\n"):
+                        indented.pop()
+
+                    lines.extend(line[8:].rstrip() for line in indented)
+
+            self._long_description = "\n".join(lines)
+
+        return self._long_description
+
+    def load_more_info(self, folder):
         """
-        :param str folder: Folder to scan for .egg-info file
-        :param int depth: Do not scan folder for more than 'depth'
+        :param str folder: Project folder, where to look for .egg-info
         :return bool: True when .egg-info was found and leveraged
         """
-        if not self.name or not os.path.isdir(folder) or depth <= 0:
+        if not self.name:
             return False
 
-        path = os.path.join(folder, "%s.egg-info" % self.pythonified_name)
-        if os.path.isdir(path):
+        path = find_egg_info(folder, self.pythonified_name)
+        if path:
+            self.egg_info = path
             self.dependency_links = self.checked_file(path, "dependency_links.txt")
             self.entry_points_txt = self.checked_file(path, "entry_points.txt")
             self.requires_txt = self.checked_file(path, "requires.txt")
+            self.sources_txt = self.checked_file(path, "SOURCES.txt")
             return True
 
-        for fname in os.listdir(folder):
-            if self.load_more_info(os.path.join(folder, fname), depth=depth - 1):
-                return True
+        return False
+
+    @property
+    def is_trusted(self):
+        """
+        bool: True when opted in via env var SETUPMETA_TRUST_PKG_INFO, PKG-INFO is complete,
+        and accompanied by an up-to-date .egg-info (ie: we're building from an sdist)
+        In that case PKG-INFO + .egg-info are authoritative, no further auto-fill is needed
+        """
+        if self._trusted is None:
+            self._trusted = bool(os.environ.get(TRUST_PKG_INFO) and self.name and self.info.get("version") and self.egg_info)
+            if self._trusted and not self.is_egg_info_fresh():
+                trace("not trusting %s, it is older than its inputs", self.egg_info)
+                self._trusted = False
+
+        return self._trusted
+
+    def is_egg_info_fresh(self):
+        """
+        :return bool: True if self.egg_info is not older than files it was generated from (setup.py, requirements files...)
+        """
+        egg_info_mtime = file_mtime(os.path.join(self.egg_info, "PKG-INFO")) or file_mtime(self.egg_info)
+        files = project_files()
+        root = os.path.dirname(self.path)
+        for name in ["setup.py", "setup.cfg"] + REQUIREMENTS_FILES + TESTS_REQUIREMENTS_FILES:
+            path = os.path.join(root, name)
+            if files.is_file(path) and file_mtime(path) > egg_info_mtime:
+                return False
+
+        return True
+
+    def packaged_modules(self):
+        """
+        :return (list, list, str|None): Packages, py_modules and package dir (if any) as recorded in .egg-info/SOURCES.txt
+        """
+        packages = []
+        py_modules = []
+        package_dir = None
+        if self.egg_info:
+            top_level = load_list(os.path.join(self.egg_info, "top_level.txt"))
+            for line in readlines(self.sources_txt) or []:
+                path = line.strip()
+                if path.startswith("src/"):
+                    package_dir = "src"
+                    path = path[4:]
+
+                folder, _, basename = path.rpartition("/")
+                if top_level and path.partition("/")[0].partition(".py")[0] not in top_level:
+                    continue
+
+                if basename == "__init__.py" and folder:
+                    packages.append(folder.replace("/", "."))
+
+                elif not folder and basename.endswith(".py") and basename != "setup.py":
+                    py_modules.append(basename[:-3])
+
+        return packages, py_modules, package_dir
 
     def checked_file(self, folder, filename):
         """
@@ -414,10 +841,49 @@ class PackageInfo:
         :return str|None: Full path to file, if it exists
         """
         path = os.path.join(folder, filename)
-        if os.path.exists(path):
+        if project_files().is_file(path):
             return path
 
 
+def find_egg_info(folder, name, depth=3):
+    """
+    Lookup of <name>.egg-info: in 'folder' first, then its sub-folders (src/ first) level by level, down to 'depth' levels
+    Only folders that can't contain a project's .egg-info are pruned (dot-folders, build/, dist/, __pycache__/, other .egg-info/)
+    Egg-info folders are matched by pythonified name, so 'foo.bar.egg-info' is found for project 'foo-bar' for example
+
+    :param str folder: Project folder
+    :param str name: Pythonified project name
+    :param int depth: Number of folder levels to look at (1 means 'folder' only)
+    :return str|None: Full path to .egg-info folder, if found
+    """
+    key = (folder, name)
+    path = _EGG_INFO_LOCATIONS.get(key)
+    if path and os.path.isdir(path):
+        return path
+
+    files = project_files() if folder == MetaDefs.project_dir else ProjectFiles(folder)
+    candidates = [""]
+    while candidates and depth > 0:
+        subfolders = []
+        for candidate in candidates:
+            for fname, is_dir in sorted((files.listing(candidate) or {}).items()):
+                if not is_dir:
+                    continue
+
+                if fname.endswith(".egg-info"):
+                    if pythonified_name(fname[:-9]) == name:
+                        path = os.path.join(folder, candidate, fname)
+                        trace("found %s", path, category="content")
+                        _EGG_INFO_LOCATIONS[key] = path
+                        return path
+
+                elif fname[0] != "." and fname not in EGG_INFO_PRUNED_FOLDERS:
+                    subfolders.append(os.path.join(candidate, fname))
+
+        candidates = sorted(subfolders, key=lambda x: x != "src")
+        depth -= 1
+
+
 class SetupMeta(Settings):
     """ Find usable definitions throughout a project SetupPy SetupMeta """
 
@@ -427,23 +893,37 @@ class SetupMeta(Settings):
         """
         Settings.__init__(self)
         self.attrs = {}
+        self.fields = None  # type: set[str] # Fields to determine, None means all fields
+        self.pkg_info = None  # type: PackageInfo
+        self.requirements = None  # type: Requirements
+        self.scm = None  # type: setupmeta.scm.Scm
+        self.steps = []  # type: list[AutoFillStep] # Auto-fill steps that ran, in order
+        self.watched = None  # type: bool # Are we watching for changes ('explain --watch')? None means: determine from sys.argv
+        self.scanned = []  # type: list[str] # Paths (relative to project) looked at by auto-fill step currently running
+        self.versioning = None  # type: Versioning
 
     def preprocess(self, upstream):
-        self.find_project_dir(MetaDefs.dist_to_dict(upstream).pop("_setup_py_path", None))
+        attrs = MetaDefs.dist_to_dict(upstream)
+        self.find_project_dir(attrs.pop("_setup_py_path", None))
 
+        extras_require = attrs.get("extras_require")
+        if not isinstance(extras_require, dict):
+            extras_require = {}
+
+        # All '@file' references are read at once (in parallel), shared files they include get parsed only once
+        values = [attrs.get("install_requires"), attrs.get("tests_require")] + [extras_require[extra] for extra in sorted(extras_require)]
+        reqs = requirements_from_files([value[1:] for value in values if is_file_reference(value)])
         for require_field in ("install_requires", "tests_require"):
-            value = getattr(upstream, require_field)
-            if isinstance(value, basestring) and value.startswith("@"):
+            value = attrs.get(require_field)
+            if is_file_reference(value):
                 self.add_definition(require_field, value, EXPLICIT)
-                self.add_definition(require_field, requirements_from_file(value[1:]) or [], source=value[1:], override=True)
+                self.add_definition(require_field, reqs[value[1:]] or [], source=value[1:], override=True)
 
-        if isinstance(upstream.extras_require, dict):
-            if any([isinstance(deps, basestring) and deps.startswith("@") for deps in upstream.extras_require.values()]):
-                self.add_definition("extras_require", upstream.extras_require, EXPLICIT)
-                self.add_definition("extras_require", {
-                        extra: (requirements_from_file(deps[1:]) or []) if isinstance(deps, basestring) and deps.startswith("@") else deps
-                        for extra, deps in upstream.extras_require.items()
-                    }, "preprocessed", override=True)
+        if any(is_file_reference(deps) for deps in extras_require.values()):
+            self.add_definition("extras_require", extras_require, EXPLICIT)
+            self.add_definition("extras_require", {
+                    extra: (reqs[deps[1:]] or []) if is_file_reference(deps) else deps for extra, deps in extras_require.items()
+                }, "preprocessed", override=True)
 
         return self
 
@@ -452,6 +932,11 @@ class SetupMeta(Settings):
 
         self.find_project_dir(self.attrs.pop("_setup_py_path", None))
         scm = self.attrs.pop("scm", None)
+        if self.fields is None:
+            self.fields = requested_fields(sys.argv)
+
+        if self.watched is None:
+            self.watched = watch_requested(sys.argv)
 
         # Add definitions from setup()'s attrs (highest priority)
         for key, value in self.attrs.items():
@@ -464,101 +949,303 @@ class SetupMeta(Settings):
             if key in MetaDefs.all_fields:
                 self.add_definition(key, value, relative_path(self.pkg_info.path))
 
+        if self.pkg_info.is_trusted:
+            return self.finalize_from_pkg_info()
+
         # Allow to auto-fill 'name' from setup.py's __title__, if any
         self.merge(SimpleModule("setup.py"))
         title = self.definitions.get("title")
         if title:
             self.auto_fill("name", title.value, source=title.source)
 
-        if "--name" in sys.argv[1:3]:
-            # No need to waste time auto-filling anything if all we need to show is package name
+        if not self.wants_modules:
+            # No need to waste time auto-filling what wasn't asked for (for example: 'setup.py --name')
+            if self.wants("install_requires", "tests_require", "dependency_links"):
+                self.auto_fill_requirements()
+
+            if self.wants("entry_points"):
+                self.auto_fill_entry_points()
+
             return self
 
-        packages = self.attrs.get("packages", [])
-        py_modules = self.attrs.get("py_modules", [])
+        self.scm = scm
+        self.run_auto_fill()
+        return self
 
-        if not packages and not py_modules and self.name:
-            # Try to auto-determine a good default from 'self.name'
-            name = self.pythonified_name
-            src_folder = project_path("src")
-            if os.path.isdir(src_folder):
-                trace("looking for src packages in %s" % src_folder)
-                packages = setuptools.find_packages(where=src_folder)
-                if not packages and os.path.isfile(project_path("src", "%s.py" % name)):
-                    py_modules = [name]
+    def auto_fill_steps(self):
+        """
+        Each step may rely on what previous steps determined (first value wins),
+        so when re-running a step, all the steps that follow it must be re-run as well
 
-                if packages or py_modules:
-                    self.auto_fill("package_dir", {"": "src"})
+        :return list(tuple): Auto-fill steps, in order: function, relative paths it looks at, function giving state of other inputs
+        """
+        return [
+            (self.auto_fill_modules, ["", "src"], self.packages_state),
+            (self.auto_fill_version, [VERSION_FILE], self.scm_state),
+            (self.auto_fill_contacts, [], None),
+            (self.auto_fill_requirements, ["", "tests"] + REQUIREMENTS_FILES + TESTS_REQUIREMENTS_FILES, self.requirements_state),
+            (self.auto_fill_classifiers, [CLASSIFIERS], None),
+            (self.auto_fill_entry_points, ["entry_points.ini"], None),
+            (self.auto_fill_license, [""], None),
+            (self.auto_fill_long_description, [""], None),
+            (self.auto_fill_include_package_data, ["MANIFEST.in"], None),
+            (self.sort_classifiers, [], None),
+        ]
+
+    def run_auto_fill(self, start=0):
+        """
+        :param int start: Index of first auto-fill step to run, definitions are restored to what they were before that step
+        """
+        if start < len(self.steps):
+            trace("re-running auto-fill from step %s", self.steps[start].name)
+            self.definitions = self.steps[start].restored_definitions()
+            del self.steps[start:]
+            ProjectFiles.reset()
+
+        timed = tracing("timing")
+        for function, inputs, state in self.auto_fill_steps()[start:]:
+            # Snapshots and fingerprints are needed only when watching for changes ('explain --watch'),
+            # except for the snapshot before 1st step, which allows to start watching later on
+            snapshot = self.definitions if self.watched or not self.steps else None
+            step = AutoFillStep(function, snapshot, inputs, state=state)
+            self.scanned = []
+            started = timed and time.time()
+            function()
+            if timed:
+                trace("auto-fill step %s took %.4fs", step.name, time.time() - started, category="timing")
+
+            step.record_inputs(self.definitions if self.watched else None, self.scanned)
+            self.steps.append(step)
+
+    def first_outdated_step(self):
+        """
+        :return int|None: Index of first auto-fill step whose inputs changed since it ran (or that has no fingerprint), if any
+        """
+        for i, step in enumerate(self.steps):
+            if step.fingerprint is None or step.current_fingerprint() != step.fingerprint:
+                return i
 
-            else:
-                src_folder = project_path()
-                if os.path.isdir(src_folder):
-                    trace("looking for direct packages in %s" % src_folder)
-                    with current_folder(src_folder):
-                        raw_packages = setuptools.find_packages()
-                        if raw_packages:
-                            # Keep only packages that start with the expected name
-                            # For any other use-case, user must explicitly list their packages
-                            packages = [p for p in raw_packages if p.startswith(name)]
-                            if packages != raw_packages:
-                                trace("all packages found: %s" % raw_packages)
-
-                if not packages and os.path.isfile(project_path("%s.py" % name)):
-                    py_modules = [name]
+    def auto_fill_modules(self):
+        """ Auto-fill packages, and scan the usual/conventional places for definitions """
+        packages, py_modules = self.auto_fill_packages()
+        for path in module_candidates(packages, py_modules):
+            self.scanned.append(path)
+            self.merge(SimpleModule(path))
 
-            if packages:
-                self.auto_fill("packages", sorted(packages))
+        self.check_packages()
 
-            if py_modules:
-                self.auto_fill("py_modules", py_modules)
+    def package_folders(self):
+        """
+        :return list(str): Folders (relative to project) of packages, if any
+        """
+        return package_folders(self.definitions)
 
-        # Scan the usual/conventional places
-        for py_module in py_modules:
-            self.merge(SimpleModule("%s.py" % py_module))
-
-        for package in packages:
-            if package and "." not in package:
-                # Look at top level modules only
-                self.merge(
-                    SimpleModule(package, "__about__.py"),
-                    SimpleModule(package, "__version__.py"),
-                    SimpleModule(package, "__init__.py"),
-                    SimpleModule("src", package, "__about__.py"),
-                    SimpleModule("src", package, "__version__.py"),
-                    SimpleModule("src", package, "__init__.py"),
-                )
+    def packages_state(self):
+        """
+        :return tuple: mtimes of package folders (they change when modules get added or removed)
+        """
+        return tuple(file_mtime(project_path(folder)) for folder in self.package_folders())
 
-        if not self.name:
-            warn("'name' not specified in setup.py, auto-fill will be incomplete")
+    def input_paths(self):
+        """
+        :return list(str): Paths (relative to project) of all files and folders that definitions were computed from, or looked at
+        """
+        paths = set(candidate_paths(MetaDefs.project_dir, self.definitions))
+        for step in self.steps:
+            paths.update(step.inputs)
 
-        elif not self.definitions.get("packages") and not self.definitions.get("py_modules"):
-            warn("No 'packages' or 'py_modules' defined, this is an empty python package")
+        if self.requirements:
+            paths.update(relative_path(path) for path in self.requirements.source_paths)
+
+        files = project_files()
+        for definition in self.definitions.values():
+            for entry in definition.sources:
+                path = entry.source and entry.source.partition(":")[0]
+                if path and files.is_file(path):
+                    paths.add(path)
+
+        return sorted(paths)
 
-        scm = scm or project_scm(MetaDefs.project_dir)
-        self.versioning = Versioning(self, scm)
+    def auto_fill_version(self):
+        self.scm = self.scm or project_scm(MetaDefs.project_dir)
+        self.versioning = Versioning(self, self.scm)
         self.versioning.auto_fill_version()
 
-        self.fill_urls()
+    def scm_state(self):
+        """
+        :return list|None: Where git's HEAD is, all tags and whether checkout is dirty, if applicable (all can change the version)
+        """
+        checkout_state = getattr(self.scm, "checkout_state", None)
+        return checkout_state and checkout_state()
 
+    def auto_fill_contacts(self):
+        self.fill_urls()
         self.auto_adjust("author", self.extract_email)
         self.auto_adjust("contact", self.extract_email)
         self.auto_adjust("maintainer", self.extract_email)
 
+    def wants(self, *keys):
+        """
+        :param keys: Keys to check
+        :return bool: True if any of the 'keys' needs to be determined (all keys do, unless only specific fields were requested)
+        """
+        return self.fields is None or any(key in self.fields for key in keys)
+
+    @property
+    def wants_modules(self):
+        """bool: Do we need to scan project's modules (and auto-fill everything that depends on them)?"""
+        return self.fields is None or bool(self.fields - STANDALONE_FIELDS)
+
+    def auto_fill_requirements(self):
         self.requirements = Requirements(self.pkg_info)
         self.auto_fill_requires("install_requires")
         self.auto_fill_requires("tests_require")
         if self.requirements.dependency_links:
             self.auto_fill("dependency_links", self.requirements.dependency_links, self.requirements.links_source)
 
-        self.auto_fill_classifiers()
+    def requirements_state(self):
+        """
+        :return tuple: mtimes of all requirement files used, including the ones referred to via '-r'
+        """
+        if self.requirements:
+            return tuple(file_mtime(path) for path in self.requirements.source_paths)
+
+    def load_definitions(self, upstream, path):
+        """
+        Load definitions finalized by a previous step of the same build (see setupmeta.build_meta), instead of computing them again
+
+        :param upstream: Either a dict or Distribution
+        :param str path: Path to json file written by save_definitions()
+        :return bool: True if definitions could be loaded
+        """
+        import json
+
+        try:
+            with io.open(path, "rt") as fh:
+                data = json.load(fh)
+
+        except (IOError, OSError, ValueError):
+            return False
+
+        trace("loading definitions from %s", path)
+        self.attrs.update(MetaDefs.dist_to_dict(upstream))
+        self.find_project_dir(self.attrs.pop("_setup_py_path", None))
+        self.attrs.pop("scm", None)
+        for key, value in self.attrs.items():
+            if key not in self.definitions:
+                self.add_definition(key, value, EXPLICIT)
+
+        for key, definition in deserialized_definitions(data).items():
+            if key not in self.definitions:
+                self.definitions[key] = definition
+
+        return True
+
+    def save_definitions(self, path):
+        """
+        Save finalized definitions, so that subsequent steps of the same build can reuse them.
+        Explicit definitions are not saved (they are taken from setup() attrs each time), nor are values that aren't json serializable.
+
+        :param str path: Path to json file to write
+        """
+        import json
+
+        definitions = {}
+        for key, definition in self.definitions.items():
+            if not definition.is_explicit:
+                try:
+                    json.dumps(definition.value)
+                    definitions[key] = definition
+
+                except (TypeError, ValueError):
+                    trace("not saving non-serializable %s", definition)
+
+        with open(path, "w") as fh:
+            json.dump(serialized_definitions(definitions), fh, sort_keys=True)
+
+    def finalize_from_pkg_info(self):
+        """
+        Building from an sdist: PKG-INFO and its .egg-info are authoritative, no need to look at anything else.
+        Only packages (if not explicitly stated) are determined, from .egg-info/SOURCES.txt preferably.
+        """
+        trace("trusting %s, skipping auto-fill", self.pkg_info.path)
+        if not self.attrs.get("packages") and not self.attrs.get("py_modules"):
+            packages, py_modules, package_dir = self.pkg_info.packaged_modules()
+            if package_dir and (packages or py_modules):
+                self.auto_fill("package_dir", {"": package_dir}, relative_path(self.pkg_info.sources_txt))
+
+            if packages:
+                self.auto_fill("packages", sorted(packages), relative_path(self.pkg_info.sources_txt))
+
+            if py_modules:
+                self.auto_fill("py_modules", py_modules, relative_path(self.pkg_info.sources_txt))
+
+            if not packages and not py_modules:
+                self.auto_fill_packages()
+
+        self.check_packages()
+        self.versioning = Versioning(self, None)
+        self.versioning.auto_fill_version()
+        self.auto_fill_requirements()
         self.auto_fill_entry_points()
-        self.auto_fill_license()
         self.auto_fill_long_description()
         self.auto_fill_include_package_data()
         self.sort_classifiers()
 
         return self
 
+    def auto_fill_packages(self):
+        """
+        :return (list, list): Packages and py_modules (explicitly given, or auto-filled)
+        """
+        packages = self.attrs.get("packages", [])
+        py_modules = self.attrs.get("py_modules", [])
+
+        if not packages and not py_modules and self.name:
+            # Try to auto-determine a good default from 'self.name'
+            name = self.pythonified_name
+            files = project_files()
+            src_folder = project_path("src")
+            if files.is_dir(src_folder):
+                trace("looking for src packages in %s", src_folder, category="content")
+                packages = find_packages(src_folder)
+                if not packages and files.is_file(project_path("src", "%s.py" % name)):
+                    py_modules = [name]
+
+                if packages or py_modules:
+                    self.auto_fill("package_dir", {"": "src"})
+
+            else:
+                src_folder = project_path()
+                if files.is_dir(src_folder):
+                    trace("looking for direct packages in %s", src_folder, category="content")
+                    raw_packages = find_packages(src_folder)
+                    if raw_packages:
+                        # Keep only packages that start with the expected name
+                        # For any other use-case, user must explicitly list their packages
+                        packages = [p for p in raw_packages if p.startswith(name)]
+                        if packages != raw_packages:
+                            trace("all packages found: %s", raw_packages, category="content")
+
+                if not packages and files.is_file(project_path("%s.py" % name)):
+                    py_modules = [name]
+
+            if packages:
+                self.auto_fill("packages", sorted(packages))
+
+            if py_modules:
+                self.auto_fill("py_modules", py_modules)
+
+        return packages, py_modules
+
+    def check_packages(self):
+        """Warn when we couldn't determine packages"""
+        if not self.name:
+            warn("'name' not specified in setup.py, auto-fill will be incomplete")
+
+        elif not self.definitions.get("packages") and not self.definitions.get("py_modules"):
+            warn("No 'packages' or 'py_modules' defined, this is an empty python package")
+
     def resolved_url(self, url, base=None):
         """
         :param str|None url: Url to resolve
@@ -595,23 +1282,28 @@ class SetupMeta(Settings):
         :param str|None setup_py_path: Given setup.py (when invoked from test)
         """
         if not setup_py_path:
+            import inspect
+
             # Determine path to setup.py module from call stack
             for frame in inspect.stack():
                 module = inspect.getmodule(frame[0])
                 if module and is_setup_py_path(module.__file__):
                     setup_py_path = module.__file__
-                    trace("setup.py found from call stack: %s" % setup_py_path)
+                    trace("setup.py found from call stack: %s", setup_py_path)
                     break
 
         if not setup_py_path and sys.argv:
             if is_setup_py_path(sys.argv[0]):
                 setup_py_path = sys.argv[0]
-                trace("setup.py found from sys.argv: %s" % setup_py_path)
+                trace("setup.py found from sys.argv: %s", setup_py_path)
 
         if is_setup_py_path(setup_py_path):
             setup_py_path = os.path.abspath(setup_py_path)
             MetaDefs.project_dir = os.path.dirname(setup_py_path)
-            trace("project dir: %s" % MetaDefs.project_dir)
+            trace("project dir: %s", MetaDefs.project_dir)
+
+        # Files may have changed since last time we looked (tests, or repeated invocations from same process)
+        ProjectFiles.reset()
 
     def extract_short_description(self, contents):
         """
@@ -634,10 +1326,17 @@ class SetupMeta(Settings):
         docstring_lead = self.definitions.pop("docstring_lead", None)
         if docstring_lead and not self.value("description"):
             self.auto_fill("description", docstring_lead.value, source=docstring_lead.source)
+        if self.pkg_info.long_description:
+            self.add_definition("long_description", self.pkg_info.long_description, relative_path(self.pkg_info.path))
+
+        if self.pkg_info.is_trusted:
+            return
+
         best_content_type = None
         best_readme = None
         best_long = None
         for readme in resolved_paths(READMES):
+            self.scanned.append(readme)
             value = load_readme(readme)
             if not value:
                 continue
@@ -656,13 +1355,16 @@ class SetupMeta(Settings):
     def auto_fill_entry_points(self, key="entry_points"):
         if self.pkg_info.entry_points_txt:
             self.add_definition(key, load_contents(self.pkg_info.entry_points_txt), relative_path(self.pkg_info.entry_points_txt))
+        if self.pkg_info.is_trusted:
+            return
         path = "%s.ini" % key
         self.add_definition(key, load_contents(path), path)
 
     def auto_fill_license(self, key="license"):
         """ Try to auto-determine the license """
-        contents, _ = find_contents(["LICENSE*"], limit=20)
-        short = determined_license(contents)
+        self.scanned.extend(resolved_paths(LICENSES))
+        contents, _ = find_contents(LICENSES, limit=20)
+        short = contents and cached("license", [contents], lambda: determined_license(contents))
         if short:
             self.auto_fill("license", short)
 
@@ -698,7 +1400,7 @@ class SetupMeta(Settings):
         """Auto-fill 'include_package_data' if a MANIFEST.in file exists in project"""
         if "include_package_data" not in self.attrs:
             manifest = os.path.join(MetaDefs.project_dir, "MANIFEST.in")
-            if os.path.isfile(manifest):
+            if project_files().is_file(manifest):
                 self.add_definition("include_package_data", True, os.path.basename(manifest))
 
     def auto_fill(self, field, value, source="auto-fill", override=False):
@@ -2,6 +2,7 @@ import os
 import re
 
 import setupmeta
+from setupmeta.cache import cached
 
 
 RE_BRANCH_STATUS = re.compile(r"^## (.+)\.\.\.(([^/]+)/)?([^ ]+)\s*(\[(.+)\])?$")
@@ -184,7 +185,7 @@ class Git(Scm):
         # Allow to override git describe command via env var SETUPMETA_GIT_DESCRIBE_COMMAND (just in case)
         cmd = os.environ.get("SETUPMETA_GIT_DESCRIBE_COMMAND", "describe --dirty --tags --long --match *.* --first-parent")
         cmd = cmd.split(" ")
-        text = self.get_output(*cmd)
+        text = cached("git-describe", lambda: self.describe_key(cmd, dirty), lambda: self.get_output(*cmd))
         version = self.parsed_version(text, dirty)
         if version:
             return version
@@ -196,6 +197,79 @@ class Git(Scm):
         distance = distance.count("\n") + 1 if distance else 0
         return Version(None, distance, commitid, dirty)
 
+    def git_dir(self):
+        """
+        :return str: Path to .git/ folder
+        """
+        git_dir = os.path.join(self.root, ".git")
+        if os.path.isfile(git_dir):
+            # Worktrees and submodules have a .git file of the form: "gitdir: <path>"
+            with open(git_dir) as fh:
+                git_dir = os.path.join(self.root, fh.read().partition(":")[2].strip())
+
+        return git_dir
+
+    def head_commit(self, git_dir=None):
+        """
+        :param str|None git_dir: Path to .git/ folder (default: self.git_dir())
+        :return str|None: Commit HEAD points to (or its ref, if it could not be resolved), read from files in .git/
+        """
+        git_dir = git_dir or self.git_dir()
+        head = _read_first_line(os.path.join(git_dir, "HEAD"))
+        if head and head.startswith("ref:"):
+            ref = head[4:].strip()
+            commit = _read_first_line(os.path.join(git_dir, ref))
+            if not commit:
+                for line in _read_lines(os.path.join(git_dir, "packed-refs")):
+                    if line.endswith(" %s" % ref):
+                        commit = line.partition(" ")[0]
+                        break
+
+            head = commit or head
+
+        return head
+
+    def tags_state(self, git_dir=None):
+        """
+        :param str|None git_dir: Path to .git/ folder (default: self.git_dir())
+        :return list(str): All tags and the commits they point to, read from files in .git/
+        """
+        git_dir = git_dir or self.git_dir()
+        result = [line for line in _read_lines(os.path.join(git_dir, "packed-refs")) if "refs/tags/" in line or line.startswith("^")]
+        tags_dir = os.path.join(git_dir, "refs", "tags")
+        for root, _, files in os.walk(tags_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                result.append("%s %s" % (_read_first_line(path), os.path.relpath(path, tags_dir)))
+
+        return sorted(result)
+
+    def state_key(self):
+        """
+        :return list|None: Where HEAD is (ref and commit) and all tags, None if HEAD commit could not be determined
+        """
+        git_dir = self.git_dir()
+        head = _read_first_line(os.path.join(git_dir, "HEAD"))
+        commit = self.head_commit(git_dir)
+        if commit and not commit.startswith("ref:"):
+            return [head, commit, self.tags_state(git_dir)]
+
+    def checkout_state(self):
+        """
+        :return list|None: Where HEAD is, all tags, and whether checkout is dirty (everything that can change the version)
+        """
+        key = self.state_key()
+        return key and key + [self.is_dirty()]
+
+    def describe_key(self, cmd, dirty):
+        """
+        :param list(str) cmd: 'git describe' command used
+        :param bool dirty: Whether checkout is dirty or not
+        :return list|None: Inputs fully determining output of 'git describe', None if HEAD commit could not be determined
+        """
+        key = self.state_key()
+        return key and key + [cmd, dirty]
+
     def has_origin(self):
         if self._has_origin is None:
             self._has_origin = bool(self.get_output("config", "--get", "remote.origin.url"))
@@ -238,6 +312,24 @@ class Git(Scm):
                 print("Not running 'git push --tags origin' as you don't have an origin")
 
 
+def _read_lines(path):
+    """
+    :param str path: Path to file to read
+    :return list(str): Stripped lines of file, empty list if file is not readable
+    """
+    try:
+        with open(path) as fh:
+            return [line.strip() for line in fh]
+
+    except (IOError, OSError):
+        return []
+
+
+def _read_first_line(path):
+    lines = _read_lines(path)
+    return lines[0] if lines else None
+
+
 class Version:
     """
     Version broken down for setupmeta usage purposes
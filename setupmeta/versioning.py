@@ -40,7 +40,7 @@ def project_scm(root):
     if os.path.isfile(version_file):
         return Snapshot(root)
 
-    setupmeta.trace("could not determine SCM for '%s'" % root)
+    setupmeta.trace("could not determine SCM for '%s'", root, category="scm")
     return None
 
 
@@ -416,7 +416,7 @@ class Versioning:
         elif not self.scm:
             self.problem = "project not under a supported SCM"
 
-        setupmeta.trace("versioning given: '%s', strategy: [%s], problem: [%s]" % (given, self.strategy, self.problem))
+        setupmeta.trace("versioning given: '%s', strategy: [%s], problem: [%s]", given, self.strategy, self.problem, category="scm")
 
     def auto_fill_version(self):
         """
@@ -430,7 +430,7 @@ class Versioning:
             return
 
         if not self.enabled:
-            setupmeta.trace("not auto-filling version, versioning is disabled")
+            setupmeta.trace("not auto-filling version, versioning is disabled", category="scm")
             return
 
         vdef = self.meta.definitions.get("version")
@@ -446,7 +446,7 @@ class Versioning:
             if self.strategy:
                 setupmeta.warn(self.problem)
 
-            setupmeta.trace("not auto-filling version due to problem: [%s]" % self.problem)
+            setupmeta.trace("not auto-filling version due to problem: [%s]", self.problem, category="scm")
             return
 
         gv = self.scm.get_version()
@@ -1,10 +1,19 @@
+import contextlib
+import json
 import os
 import re
+import shutil
+import socket
+import sys
+import threading
+import time
 
+import pytest
 from mock import patch
 from six import StringIO
 
 import setupmeta
+from setupmeta.cli import main, MetaServer, query
 from setupmeta.commands import _show_dependencies, DepTree, find_venv
 
 from . import conftest
@@ -39,6 +48,43 @@ def test_check(sample_project):
     assert "Pending changes:" in output
 
 
+def test_check_diff(sample_project):
+    output = conftest.run_setup_py(sample_project, "check", "--diff")
+    assert output == "[setupmeta] no previous snapshot of requirements, saving one in build/setupmeta-reqs.json"
+    assert os.path.isfile(os.path.join(sample_project, "build", "setupmeta-reqs.json"))
+    assert not os.path.exists(os.path.join(sample_project, "sample.egg-info"))  # No .egg-info created
+
+    output = conftest.run_setup_py(sample_project, "check", "--diff")
+    assert output == "[setupmeta] requirements unchanged"
+
+    with open(os.path.join(sample_project, "req1.txt"), "a") as fh:
+        fh.write("\n")
+
+    output = conftest.run_setup_py(sample_project, "check", "--diff")
+    # Checkout is now dirty, so there may be some output from git first
+    assert output.endswith("[setupmeta] requirements unchanged")
+
+    with open(os.path.join(sample_project, "requirements.txt"), "w") as fh:
+        fh.write("-r req1.txt\nattrs==20.0\n# indirect\nsix==1.0\n")
+
+    with open(os.path.join(sample_project, "req1.txt"), "w") as fh:
+        fh.write("# pinned\nclick==8.0\n")
+
+    output = conftest.run_setup_py(sample_project, "check", "--diff")
+    assert output.splitlines()[-4:] == [
+        "[setupmeta] install_requires changes:",
+        "  + attrs (abstracted, from requirements.txt:2)",
+        "  ~ click==8.0 (pinned, from req1.txt:2), was: click>7.0 (untouched)",
+        "  + six==1.0 (ignored, from requirements.txt:4)",
+    ]
+    assert conftest.run_setup_py(sample_project, "check", "--diff").endswith("[setupmeta] requirements unchanged")
+
+    # Snapshot can be kept elsewhere
+    output = conftest.run_setup_py(sample_project, "check", "--diff", "--snapshot=.cache/reqs.json")
+    assert output.endswith("[setupmeta] no previous snapshot of requirements, saving one in .cache/reqs.json")
+    assert os.path.isfile(os.path.join(sample_project, ".cache", "reqs.json"))
+
+
 def test_check_dependencies():
     if os.environ.get("VIRTUAL_ENV"):
         # check --deptree is only useful when ran from a venv, which is guaranteed when invoking tests via tox (but may not be otherwise)
@@ -65,7 +111,7 @@ def test_check_dependencies():
         with patch("os.path.isdir", return_value=True):
             assert find_venv()
 
-    with patch("setupmeta.pkg_resources", spec=str):
+    with patch("setupmeta.get_pkg_resources", return_value=None):
         with conftest.capture_output() as logged:
             assert _show_dependencies(None) == 1
             assert "pkg_resources is not available" in logged
@@ -193,6 +239,201 @@ def test_explain():
     )
 
 
+def test_explain_target_environment(sample_project):
+    with open(os.path.join(sample_project, "requirements.txt"), "w") as fh:
+        fh.write("click\ncolorama; sys_platform == 'win32'\nmock; python_version < '3'\nfoo; extra == 'bar'\n")
+        fh.write("pytest-extra-durations; sys_platform == 'win32'\ntomli; python_full_version >= '3.9.0'\n")
+
+    output = conftest.run_setup_py(sample_project, "explain", "-d")
+    assert "dropped" not in output
+
+    with patch.dict(os.environ, {setupmeta.TARGET_ENV: "sys_platform=linux, python_version=3.8"}):
+        output = conftest.run_setup_py(sample_project, "meta", "--query", "install_requires", "--json")
+        assert json.loads(output) == {"install_requires": ["click", "foo; extra == 'bar'"]}
+
+        output = conftest.run_setup_py(sample_project, "explain", "-d")
+        assert "# \"colorama; sys_platform == 'win32'\"," in output
+        assert '# "mock; python_version < \'3\'",' in output
+        assert '# "pytest-extra-durations; sys_platform == \'win32\'",' in output
+        assert '# "tomli; python_full_version >= \'3.9.0\'",' in output
+        for line in range(2, 7):
+            assert ("requirements.txt:%s, dropped for target environment" % line in output) is (line != 4)
+
+    assert setupmeta.marker_applies("foo; extra == 'bar' and sys_platform == 'win32'", (("sys_platform", "linux"),))
+    assert not setupmeta.marker_applies("foo; sys_platform == 'win32' and os_name == 'extra'", (("sys_platform", "linux"),))
+    with patch.dict(os.environ, {setupmeta.TARGET_ENV: "python_full_version=3.7.2"}):
+        assert setupmeta.target_environment() == (("python_full_version", "3.7.2"), ("python_version", "3.7"))
+
+    with patch.dict(os.environ, {setupmeta.TARGET_ENV: "sys_platform=win32"}):
+        output = conftest.run_setup_py(sample_project, "meta", "--query", "install_requires", "--json")
+        assert json.loads(output)["install_requires"][:2] == ["click", "colorama; sys_platform == 'win32'"]
+
+
+def test_meta(sample_project):
+    output = conftest.run_setup_py(sample_project, "meta", "--query", "name,entrypoints,install_requires", "--json")
+    assert json.loads(output) == {"name": "sample", "entrypoints": None, "install_requires": ["click>7.0"]}
+
+    run_setup_py(["meta", "--query=name,version"], "name: sample\nversion: [0-9]")
+    run_setup_py(["meta"], "install_requires: .+click\nname: sample")
+    run_setup_py(
+        ["meta", "--query", "name,entrypoints,version", "--json"],
+        """
+            "name": "setupmeta",
+            "entrypoints": \\[\\]
+            "version": "[0-9]
+        """,
+        folder=conftest.PROJECT_DIR,
+    )
+
+
+def test_batch():
+    with conftest.capture_output() as logged:
+        assert main([]) == 1
+        assert "usage: python -m setupmeta" in logged
+
+    with conftest.capture_output() as logged:
+        assert main(["batch", "-j1", "-q", "name,version", conftest.resouce("scenarios", "pinned"), "/dev/null/foo"]) == 1
+        lines = [json.loads(line) for line in str(logged).splitlines() if line.startswith("{")]
+        assert len(lines) == 2
+        assert lines[0]["fields"] == {"name": "pinned", "version": "0.1.0"}
+        assert lines[0]["sources"] == {"name": "explicit", "version": "pinned.py:8"}
+        assert lines[0]["elapsed"] >= 0
+        assert lines[1]["error"] == "UsageError: no setup.py in /dev/null/foo"
+
+    with conftest.capture_output() as logged:
+        # Pseudo fields (such as 'entrypoints') are reported under their requested name
+        assert main(["batch", "-j1", "-q", "entrypoints,name", os.path.join(conftest.PROJECT_DIR, "examples", "hierarchical")]) == 0
+        lines = [json.loads(line) for line in str(logged).splitlines() if line.startswith("{")]
+        assert lines[0]["fields"]["name"] == "hierarchical"
+        assert lines[0]["fields"]["entrypoints"] == ["hierarchical = hierarchical:main", "subm = hierarchical.submodule:main"]
+        assert lines[0]["sources"]["entrypoints"] == "entry_points.ini"
+
+    folders = [conftest.resouce("scenarios", "pinned"), conftest.resouce("scenarios", "simple-src")]
+    folders.append(os.path.join(conftest.PROJECT_DIR, "examples", "direct"))
+    output = conftest.run_program(sys.executable, "-m", "setupmeta", "batch", "-j2", *folders, cwd=conftest.PROJECT_DIR)
+    lines = [json.loads(line) for line in output.splitlines()]
+    assert [line["project"] for line in lines] == folders
+    assert lines[1]["fields"]["py_modules"] == ["my_app"]
+    assert lines[2]["fields"]["install_requires"] == ["click>=6.7"]
+    assert lines[2]["sources"]["version"] == "direct/__init__.py:8"
+
+
+@contextlib.contextmanager
+def meta_server(socket_path):
+    """Run a MetaServer on 'socket_path' in a thread, for the duration of the context"""
+    server = MetaServer(socket_path)
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+    try:
+        for _ in range(100):
+            if os.path.exists(socket_path):
+                break
+
+            time.sleep(0.05)
+
+        yield server
+
+    finally:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(socket_path)
+        client.sendall(b'{"stop": true}\n')
+        assert json.loads(setupmeta.decode(client.recv(1024))) == {"stopped": True}
+        client.close()
+        thread.join()
+        assert not os.path.exists(socket_path)
+
+
+@pytest.mark.skipif(setupmeta.WINDOWS, reason="Unix sockets only")
+def test_serve():
+    with setupmeta.temp_resource() as temp:
+        project = os.path.join(temp, "project")
+        shutil.copytree(conftest.resouce("scenarios", "simple-src"), project)
+        socket_path = os.path.join(temp, "setupmeta.sock")
+        with meta_server(socket_path):
+            response = query(socket_path, project, ["name", "py_modules"])
+            assert response["cached"] is False
+            assert response["fields"] == {"name": "my-app", "py_modules": ["my_app"]}
+            assert response["sources"] == {"name": "explicit", "py_modules": "auto-fill"}
+
+            response = query(socket_path, project, "description")
+            assert response["cached"] is True
+            assert response["fields"] == {}
+
+            # Adding a README changes project's folder mtime, which invalidates what we computed so far
+            time.sleep(0.01)
+            with open(os.path.join(project, "README.rst"), "w") as fh:
+                fh.write("My app does this and that\n")
+
+            response = query(socket_path, project, "description")
+            assert response["cached"] is False
+            assert response["fields"] == {"description": "My app does this and that"}
+            assert response["sources"] == {"description": "README.rst:1"}
+            assert query(socket_path, project, "description")["cached"] is True
+
+            # LICENSE doesn't appear as source of any definition, but editing it must still be noticed
+            license_path = os.path.join(project, "LICENSE")
+            with open(license_path, "w") as fh:
+                fh.write("All rights reserved\n")
+
+            assert query(socket_path, project, "license")["fields"] == {}
+            with open(license_path, "w") as fh:
+                fh.write("MIT License\n")
+
+            os.utime(license_path, (time.time() + 10, time.time() + 10))
+            response = query(socket_path, project, "license")
+            assert response["cached"] is False
+            assert response["fields"] == {"license": "MIT"}
+
+            # An idle client does not prevent others from being served
+            idle = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            idle.connect(socket_path)
+            try:
+                assert query(socket_path, project, "license")["cached"] is True
+
+            finally:
+                idle.close()
+
+            # Refuse to start a 2nd server on the same socket
+            with pytest.raises(setupmeta.UsageError):
+                MetaServer(socket_path).serve()
+
+            assert query(socket_path, temp)["error"] == "UsageError: no setup.py in %s" % temp
+            assert query(socket_path, None)["error"] == "UsageError: no 'project' specified"
+
+        # Only stale sockets get removed, other files are left alone
+        with open(socket_path, "w") as fh:
+            fh.write("not a socket\n")
+
+        with pytest.raises(setupmeta.UsageError):
+            MetaServer(socket_path).serve()
+
+        assert os.path.isfile(socket_path)
+
+
+@pytest.mark.skipif(setupmeta.WINDOWS, reason="Unix sockets only")
+def test_serve_git_state(sample_project):
+    socket_path = os.path.join(os.path.dirname(sample_project), "setupmeta.sock")
+    with meta_server(socket_path):
+        response = query(socket_path, sample_project, "version")
+        assert response["cached"] is False
+        assert response["fields"] == {"version": "0.0.1"}
+        assert query(socket_path, sample_project, "version")["cached"] is True
+
+        # Retagging doesn't touch HEAD nor the index, but does change the version
+        conftest.run_git("tag", "-a", "v0.3.0", "-m", "Version 0.3.0")
+        response = query(socket_path, sample_project, "version")
+        assert response["cached"] is False
+        assert response["fields"] == {"version": "0.3.0"}
+
+        # Neither does an unstaged edit of a file that is not an input
+        with open(os.path.join(sample_project, ".gitignore"), "a") as fh:
+            fh.write("foo\n")
+
+        response = query(socket_path, sample_project, "version")
+        assert response["cached"] is False
+        assert response["fields"] == {"version": "0.3.0.dirty"}
+
+
 def test_version(sample_project):
     run_setup_py(["version", "--bump", "major", "--simulate-branch=HEAD"], "Can't bump branch 'HEAD'")
 
@@ -1,8 +1,14 @@
 import os
+import subprocess  # nosec
+import sys
+import time
 
 import pytest
+from mock import patch
 
 import setupmeta
+from setupmeta import content
+from setupmeta.cache import cached, MetaCache
 
 from . import conftest
 
@@ -95,6 +101,37 @@ def test_run_program():
     setupmeta.DEBUG = False
 
 
+class Unrepresentable(object):
+    def __repr__(self):
+        raise AssertionError("formatted while tracing is off")
+
+
+def test_trace():
+    setupmeta.DEBUG = False
+    setupmeta.trace("not shown %s", Unrepresentable(), category="reqs")  # Formatting is deferred
+    with patch("setupmeta.model.short") as short:
+        setupmeta.model.Definition("foo").add("x" * 500, "explicit")
+        assert not short.called  # Short representation of traced values is computed only when shown
+
+    assert not setupmeta.tracing()
+
+    setupmeta.DEBUG = "reqs, timing"
+    try:
+        with conftest.capture_output() as out:
+            setupmeta.trace("uncategorized %s", 1)
+            setupmeta.trace("about reqs %s %s", "a", 2, category="reqs")
+            setupmeta.trace("about scm %s", Unrepresentable(), category="scm")
+            setupmeta.trace("100% literal")
+            setupmeta.trace("shortened %s", "%s/foo\n  bar" % setupmeta.USER_HOME, shorten=True)
+            assert str(out).splitlines() == [":: uncategorized 1", ":: about reqs a 2", ":: 100% literal", ":: shortened ~/foo bar"]
+
+        setupmeta.DEBUG = "1"
+        assert all(setupmeta.tracing(c) for c in setupmeta.TRACE_CATEGORIES)
+
+    finally:
+        setupmeta.DEBUG = False
+
+
 def test_stringify():
     assert setupmeta.stringify((1, 2)) == '("1", "2")'
     assert setupmeta.stringify(["1", "2"]) == '["1", "2"]'
@@ -117,3 +154,142 @@ def test_meta_command_init():
     with pytest.raises(Exception):
         obj = setupmeta.MetaDefs()
         setupmeta.meta_command_init(obj, {})
+
+
+def imported_heavy_modules(code):
+    """
+    :param str code: Python code to run in a fresh interpreter
+    :return list(str): Heavy modules that got imported by running 'code'
+    """
+    heavy = ["distutils", "pkg_resources", "platform", "setuptools", "subprocess", "tempfile"]
+    code = "import sys\n%s\nprint(' '.join(m for m in %s if m in sys.modules))" % (code, heavy)
+    p = subprocess.Popen([sys.executable, "-c", code], cwd=conftest.PROJECT_DIR, stdout=subprocess.PIPE)  # nosec
+    output, _ = p.communicate()
+    assert p.returncode == 0
+    return setupmeta.decode(output).split()
+
+
+@pytest.mark.skipif(sys.version_info[:2] < (3, 7), reason="Lazy module attributes are available in python3.7+ only")
+def test_import_time():
+    # setupmeta is imported by every setup.py call: heavy modules must be imported on demand only
+    assert imported_heavy_modules("import setupmeta.model") == []
+
+    # Lazily computed attributes are still available
+    assert imported_heavy_modules("import setupmeta\nassert setupmeta.PLATFORM == __import__('platform').system().lower()") == ["platform"]
+    assert "pkg_resources" in imported_heavy_modules("import setupmeta\nassert setupmeta.pkg_resources.Requirement")
+
+
+def test_project_files():
+    files = setupmeta.ProjectFiles(conftest.PROJECT_DIR)
+    assert str(files).startswith("0 folders indexed")
+    assert files.relative(conftest.PROJECT_DIR) == ""
+    assert files.relative(os.path.join(conftest.PROJECT_DIR, "setup.py")) == "setup.py"
+    assert files.relative("/dev/null/foo") is None
+    assert files.relative("../foo") is None
+    assert files.relative("./tests") == "tests"
+
+    assert files.is_dir("")
+    assert files.is_dir("setupmeta")
+    assert not files.is_dir("setup.py")
+    assert not files.is_dir("foo/bar")
+    assert files.is_file("setup.py")
+    assert files.is_file(os.path.join(conftest.TESTS, "conftest.py"))
+    assert files.is_file(__file__)
+    assert not files.is_file("setupmeta")
+    assert not files.is_file("")
+    assert not files.is_file("foo/bar/baz.py")
+    assert not files.is_file("/dev/null/foo")
+    assert files.listing("setup.py") is None
+    assert files.listing("foo/bar") is None
+
+    assert files.glob("LICENSE*") == ["LICENSE"]
+    assert files.glob("*.py", folder="setupmeta")[0] == "__init__.py"
+    assert files.glob("*", folder="foo") == []
+
+    # Each folder is scanned at most once
+    with patch("setupmeta.scanned_folder", side_effect=Exception):
+        assert files.is_file("setupmeta/model.py")
+        assert files.glob("README*") == ["README.rst"]
+
+    assert setupmeta.scanned_folder("/dev/null/foo") is None
+
+    # Stale listings get refreshed (long running processes see files added after a folder was indexed)
+    with setupmeta.temp_resource() as temp:
+        files = setupmeta.ProjectFiles(temp)
+        assert not files.is_file("README.rst")
+        with open("README.rst", "w") as fh:
+            fh.write("Hello\n")
+
+        assert not files.is_file("README.rst")  # Listing is still recent
+        with patch("time.time", return_value=time.time() + files.max_age + 1):
+            assert files.is_file("README.rst")
+
+    # Paths outside of project are relative to project folder as well (not to current working dir)
+    files = setupmeta.ProjectFiles(conftest.TESTS)
+    assert files.is_file("../setup.py")
+    assert files.is_dir("../setupmeta")
+    with setupmeta.temp_resource() as temp:
+        os.makedirs("project/sub")
+        os.mkdir("common")
+        with open("common/reqs.txt", "w") as fh:
+            fh.write("click==7.0\n")
+
+        old_pd = setupmeta.MetaDefs.project_dir
+        try:
+            setupmeta.MetaDefs.project_dir = os.path.join(temp, "project")
+            os.chdir("project/sub")
+            assert setupmeta.requirements_from_file("../common/reqs.txt") == ["click"]
+
+        finally:
+            setupmeta.MetaDefs.project_dir = old_pd
+
+
+def test_find_packages():
+    with setupmeta.temp_resource() as temp:
+        for path in ("a/b", "a/c/d", "a/build", "e/f", "node_modules/g", ".venv/h", "build/i"):
+            os.makedirs(path)
+
+        for path in ("a", "a/b", "a/build", "a/c/d", "e/f", "node_modules/g", ".venv/h", "build/i"):
+            with open(os.path.join(path, "__init__.py"), "w") as fh:
+                fh.write("")
+
+        assert sorted(content.find_packages(temp)) == ["a", "a.b", "a.build"]
+
+        # Cached result is returned as long as examined folders are not modified
+        with patch("setupmeta.scanned_folder", side_effect=Exception):
+            assert sorted(content.find_packages(temp)) == ["a", "a.b", "a.build"]
+
+        with open(os.path.join("a/c", "__init__.py"), "w") as fh:
+            fh.write("")
+
+        assert sorted(content.find_packages(temp)) == ["a", "a.b", "a.build", "a.c", "a.c.d"]
+        assert content.find_packages(os.path.join(temp, "foo")) == []
+
+
+def test_cache():
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"foo": [1, 2]}
+
+    assert cached("test", ["a"], compute) == {"foo": [1, 2]}  # No cache configured
+    with setupmeta.temp_resource() as temp:
+        with patch.dict(os.environ, {"SETUPMETA_CACHE_DIR": temp, "SETUPMETA_CACHE_SIZE": "2000"}):
+            assert cached("test", ["a"], compute) == {"foo": [1, 2]}
+            assert cached("test", ["a"], compute) == {"foo": [1, 2]}
+            assert cached("test", lambda: ["a"], compute) == {"foo": [1, 2]}
+            assert len(calls) == 2  # 2nd and 3rd calls were served from cache
+            assert cached("test", lambda: None, compute) == {"foo": [1, 2]}  # Not cacheable
+            assert len(calls) == 3
+
+            cache = MetaCache.current()
+            assert cache.max_size == 2000
+            for i in range(100):
+                cache.put("test", "%032d" % i, "x" * 50)
+
+            assert cache.get("test", "%032d" % 99) == {"value": "x" * 50}
+            assert cache.get("test", "%032d" % 0) is None  # Least recently used entries were evicted
+            cache.evict()
+            sizes = [os.path.getsize(os.path.join(r, f)) for r, _, files in os.walk(temp) for f in files if f.endswith(".json")]
+            assert sum(sizes) <= 2000
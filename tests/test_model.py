@@ -1,5 +1,8 @@
 import os
 import sys
+import threading
+import time
+import warnings
 
 from mock import patch
 
@@ -59,6 +62,29 @@ def test_representation():
     assert not alpha1 > beta
 
 
+def test_shared_values():
+    long_text = "\n".join("line %s" % i for i in range(100))
+    e1 = DefinitionEntry("long_description", long_text, "README.md")
+    e2 = DefinitionEntry("long_description", "".join(long_text), "".join(["README", ".md"]))
+    assert e1.value is e2.value
+    assert e1.source is e2.source
+    assert not hasattr(e1, "__dict__")
+
+    definition = Definition("long_description")
+    definition.add("".join(long_text), "PKG-INFO")
+    assert definition.value is e1.value
+    assert not hasattr(definition, "__dict__")
+
+    # Shared values are not kept around for the lifetime of the process
+    assert setupmeta.model._SHARED_VALUES
+    setupmeta.clear_caches()
+    assert not setupmeta.model._SHARED_VALUES
+
+    definitions = setupmeta.compute(conftest.resouce("scenarios", "readmes"))
+    assert len(definitions["long_description"].value) >= setupmeta.model.SHARED_VALUE_MIN_SIZE
+    assert not setupmeta.model._SHARED_VALUES
+
+
 def test_requirements():
     assert setupmeta.pkg_req(None) is None
     assert setupmeta.pkg_req("#foo") is None
@@ -111,6 +137,138 @@ def test_requirements():
     assert f.abstracted == []
 
 
+def test_large_requirements():
+    # Typical pip-compile lock file: mostly comments, options and pinned requirements
+    lines = ["# This file is autogenerated by pip-compile", "--index-url https://pypi.org/simple", ""]
+    for i in range(1999):
+        lines.append("pkg%s==1.%s" % (i, i))
+        lines.append("    # via")
+        lines.append("    #   -r requirements.in")
+        lines.append("    #   other-pkg")
+        lines.append("")
+
+    lines.append("# indirect")
+    lines.append("setuptools==50.0")
+    assert len(lines) == 10000
+    f = setupmeta.RequirementsFile()
+    with patch("setupmeta.ReqEntry", side_effect=setupmeta.ReqEntry) as req_entry:
+        with patch("setupmeta.pkg_req", side_effect=setupmeta.pkg_req) as pkg_req:
+            f.scan(lines)
+            f.finalize()
+
+    assert req_entry.call_count == 2000  # Comments, blank lines and options are skipped without being parsed
+    assert pkg_req.call_count == 0  # Simple pins don't need a full parse
+    assert len(f.reqs) == 2000
+    assert len(f.filled_requirements) == 1999
+    assert f.filled_requirements[-1] == "pkg1998"
+    assert len(f.ignored) == 1
+    assert str(f.ignored[0]) == "setuptools==50.0 from adhoc:10000"
+
+
+def test_hashed_requirements():
+    sample = """
+    # pip-compile --generate-hashes
+    click==8.0.1 \\
+        --hash=sha256:aaa \\
+        --hash=sha256:bbb
+        # via -r requirements.in
+    colorama==0.4.4 --hash=sha256:ccc \\
+        --hash sha256:ddd
+    pytest==6.0 \\
+        ; python_version >= '3.6' \\
+        --hash=sha256:eee
+    foo==1.0 \\
+        # pinned
+    bar==2.0
+    """
+    f = setupmeta.RequirementsFile()
+    with patch("setupmeta.ReqEntry", side_effect=setupmeta.ReqEntry) as req_entry:
+        f.scan(sample.splitlines())
+        f.finalize()
+
+    assert req_entry.call_count == 5  # '--hash' options are not parsed as requirements
+    assert f.filled_requirements == ["click", "colorama", "pytest; python_version >= '3.6'", "foo==1.0", "bar"]
+    assert [r.line_number for r in f.reqs] == [3, 7, 9, 12, 14]
+    assert f.hashes == {
+        "click": ("sha256:aaa", "sha256:bbb"),
+        "colorama": ("sha256:ccc", "sha256:ddd"),
+        "pytest": ("sha256:eee",),
+    }
+
+
+def test_constraints():
+    with setupmeta.temp_resource() as temp:
+        touch(os.path.join(temp, "constraints.txt"), "Click==7.1.1\nrequests >= 2.23.0, < 3  # comment\n")
+        sample = "-c constraints.txt  # shared pins\nclick\n# pinned\nrequests; python_version >= '3'\nattrs\n"
+        touch(os.path.join(temp, "requirements.txt"), sample)
+        touch(os.path.join(temp, "dev.txt"), "-r requirements.txt\n--constraint ./constraints.txt\npytest\n")
+        with patch("setupmeta.readlines", side_effect=setupmeta.readlines) as read:
+            f = setupmeta.RequirementsFile.from_file(os.path.join(temp, "requirements.txt"))
+            assert sorted(f.constraints) == ["click", "requests"]
+            assert f.filled_requirements == ["click", "requests>=2.23.0,<3; python_version >= '3'", "attrs"]
+            constraint = f.constraint_for(f.reqs[0])
+            assert constraint.line_number == 1
+            assert constraint.source_path == os.path.join(temp, "constraints.txt")
+            assert f.constraint_for(f.reqs[2]) is None
+
+            f = setupmeta.RequirementsFile.from_file(os.path.join(temp, "dev.txt"), do_abstract=False)
+            assert f.filled_requirements == ["click", "requests>=2.23.0,<3; python_version >= '3'", "attrs", "pytest"]
+            assert [os.path.basename(c[0][0]) for c in read.call_args_list].count("constraints.txt") == 1
+
+
+def test_canonical_requirements():
+    assert setupmeta.canonical_name("Foo_Bar.baz") == "foo-bar-baz"
+    sample = """
+    Foo_Bar==1.0
+    foo-bar==1.0  # pinned
+    requests>=2.0
+    Requests >= 2.0
+    click; python_version < '3'
+    click>=7; python_version >= '3'
+    foo.bar==2.0
+    """
+    f = setupmeta.RequirementsFile()
+    with warnings.catch_warnings(record=True) as w:
+        warnings.simplefilter("always")
+        f.scan(sample.splitlines())
+        f.finalize()
+
+    assert f.filled_requirements == ["Foo_Bar", "requests>=2.0", "click; python_version < '3'", "click>=7; python_version >= '3'"]
+    assert [(a.line_number, b.line_number) for a, b in f.index.conflicts] == [(2, 8)]
+    assert len(w) == 1
+    assert str(w[0].message) == (
+        "Conflicting requirements for 'foo-bar': 'Foo_Bar==1.0' from adhoc:2, abstracted by default,"
+        " and 'foo.bar==2.0' from adhoc:8, abstracted by default (using the first one)"
+    )
+
+
+def test_equivalent_requirements():
+    assert setupmeta.normalized_marker("python_version<'3'") == setupmeta.normalized_marker(' python_version  <  "3"')
+    assert setupmeta.with_extras("requests>=2; os_name == 'nt'", ["socks"]) == "requests[socks]>=2; os_name == 'nt'"
+    assert setupmeta.with_extras("requests[a] >= 2", ["a", "b"]) == "requests[a,b] >= 2"
+    sample = """
+    requests>=2
+    requests[socks]>=2
+    click; python_version<"3"
+    click; python_version < '3'
+    foo[a]>=1,<2
+    foo<2, >=1
+    foo[B]>=1,<3
+    bar==1.0
+    Bar[X]==1.0
+    """
+    f = setupmeta.RequirementsFile()
+    with warnings.catch_warnings(record=True) as w:
+        warnings.simplefilter("always")
+        f.scan(sample.splitlines())
+        f.finalize()
+
+    # Extras of repeated requirements are merged, equivalent markers and specifiers are not conflicts
+    assert f.filled_requirements == ["requests[socks]>=2", 'click; python_version<"3"', "foo[a]>=1,<2", "bar[x]"]
+    assert [(a.line_number, b.line_number) for a, b in f.index.conflicts] == [(6, 8)]
+    assert len(w) == 1
+
+
 def test_empty():
     with conftest.capture_output():
         with conftest.TestMeta(setup="/dev/null/shouldnotexist/setup.py") as meta:
@@ -168,3 +326,584 @@ def test_dependency_link_extraction():
     # Try and determine name from 'file://' uri only
     incomplete_uri = "file:%s" % conftest.PROJECT_DIR
     assert setupmeta.extracted_dependency_link(incomplete_uri, True) == (incomplete_uri, None)
+
+
+def test_simple_module():
+    with setupmeta.temp_resource() as temp:
+        with patch.object(setupmeta.MetaDefs, "project_dir", temp):
+            with open("mod.py", "w") as fh:
+                fh.write('"""\nShort description\n\nauthor: Someone\n"""\n\nimport os\n\n__version__ = "1.0"\n')
+                fh.write('__url__ = "https://example.com"  # comment\n\n\ndef foo():\n    pass\n\n\n__license__ = "MIT"\n')
+
+            with open("generated.py", "w") as fh:
+                fh.write('__version__ = "2.0"\n')
+                for i in range(setupmeta.model.HEADER_MAX_LINES):
+                    fh.write("CONSTANT_%s = %s\n" % (i, i))
+
+                fh.write('__license__ = "MIT"\n')
+
+            setupmeta.ProjectFiles.reset()
+            m = setupmeta.model.SimpleModule("mod.py")
+            assert m.exists
+            assert m.value("docstring_lead") == "Short description"
+            assert m.value("author") == "Someone"
+            assert m.value("version") == "1.0"
+            assert m.definitions["url"].sources[0].source == "mod.py:10"
+            assert m.value("license") is None  # Scan stopped at 'def foo()'
+
+            m = setupmeta.model.SimpleModule("generated.py")
+            assert m.value("version") == "2.0"
+            assert m.value("license") is None  # Scan stopped after HEADER_MAX_LINES
+
+            m = setupmeta.model.SimpleModule("foo.py")
+            assert not m.exists
+            assert not m.definitions
+
+    setupmeta.ProjectFiles.reset()
+
+
+def test_pkg_info():
+    info = setupmeta.model.PackageInfo(conftest.resouce("scenarios", "packaged"))
+    assert info.name == "pre-packaged"
+    assert info.info["version"] == "1.3.2.dev4"
+    assert info.info["classifiers"] == ["Intended Audience :: Developers", "Programming Language :: Python"]
+    assert "long_description" not in info.info
+    assert info._long_description is None  # Description is loaded on demand only
+
+    description = info.long_description
+    assert description.startswith("\n# Project description\n\nThis scenario simulates")
+    assert description.endswith("setupmeta behaves in such an environment.\n")
+    assert info.long_description is description
+
+    info = setupmeta.model.PackageInfo(conftest.TESTS)
+    assert not info.name
+    assert not info.info
+    assert info.long_description is None
+
+
+def test_find_egg_info():
+    with setupmeta.temp_resource() as temp:
+        paths = ["build/foo_bar.egg-info", "lib/foo.bar.egg-info", "lib/other.egg-info", "src/foo_baz.egg-info", "lib/foo_baz.egg-info"]
+        paths += ["python/ns/foo_ns.egg-info", "a/b/c/foo_deep.egg-info", ".tox/foo_tox.egg-info", "lib/other.egg-info/foo_in.egg-info"]
+        for path in paths:
+            os.makedirs(path)
+
+        find_egg_info = setupmeta.model.find_egg_info
+        assert find_egg_info(temp, "foo_bar") == os.path.join(temp, "lib", "foo.bar.egg-info")
+        assert find_egg_info(temp, "foo_baz") == os.path.join(temp, "src", "foo_baz.egg-info")  # src/ is looked at first
+        assert find_egg_info(temp, "foo_ns") == os.path.join(temp, "python", "ns", "foo_ns.egg-info")  # Nested layout
+        assert find_egg_info(temp, "foo_deep") is None  # Too deep
+        assert find_egg_info(temp, "foo_tox") is None  # Dot-folders are pruned
+        assert find_egg_info(temp, "foo_in") is None  # Other .egg-info folders are not searched
+        assert find_egg_info(temp, "foo_qux") is None
+
+        # Location is remembered, as long as it still exists
+        with patch("setupmeta.scanned_folder", side_effect=Exception):
+            assert find_egg_info(temp, "foo_bar") == os.path.join(temp, "lib", "foo.bar.egg-info")
+
+        os.rmdir(os.path.join("lib", "foo.bar.egg-info"))
+        assert find_egg_info(temp, "foo_bar") is None
+
+
+@patch.dict(os.environ, {setupmeta.TRUST_PKG_INFO: "1"})
+def test_trusted_pkg_info():
+    info = setupmeta.model.PackageInfo(conftest.resouce("scenarios", "packaged"))
+    assert not info.is_trusted  # No .egg-info next to this PKG-INFO
+
+    with setupmeta.temp_resource() as temp:
+        os.makedirs("src/foo.egg-info")
+        touch("setup.py", "from setuptools import setup\nsetup(name='foo')\n")
+        touch("requirements.txt", "click\n")
+        touch("PKG-INFO", "Metadata-Version: 2.1\nName: foo\nVersion: 1.0\n")
+        touch("src/foo.egg-info/top_level.txt", "foo\nfoo_util\n")
+        sources = ["PKG-INFO", "setup.py", "src/foo/__init__.py", "src/foo/sub/__init__.py", "src/foo/sub/bar.py", "src/foo_util.py"]
+        touch("src/foo.egg-info/SOURCES.txt", "\n".join(sources))
+        info = setupmeta.model.PackageInfo(temp)
+        assert info.is_trusted
+        assert info.packaged_modules() == (["foo", "foo.sub"], ["foo_util"], "src")
+
+        with patch.dict(os.environ, {setupmeta.TRUST_PKG_INFO: ""}):
+            assert not setupmeta.model.PackageInfo(temp).is_trusted  # Opt-in only
+
+        # .egg-info must not be older than its inputs
+        mtime = os.path.getmtime("src/foo.egg-info") + 10
+        os.utime("requirements.txt", (mtime, mtime))
+        assert not setupmeta.model.PackageInfo(temp).is_trusted
+
+        os.remove("PKG-INFO")
+        info = setupmeta.model.PackageInfo(temp)
+        assert not info.is_trusted
+        assert info.packaged_modules() == ([], [], None)
+
+
+def test_requested_fields():
+    requested_fields = setupmeta.model.requested_fields
+    assert requested_fields(["setup.py"]) is None
+    assert requested_fields(["setup.py", "-q", "--name"]) == {"name"}
+    assert requested_fields(["setup.py", "--version"]) is None
+    assert requested_fields(["setup.py", "explain", "--name"]) is None
+    assert requested_fields(["setup.py", "meta"]) is None
+    assert requested_fields(["setup.py", "meta", "--json"]) is None
+    assert requested_fields(["setup.py", "meta", "--query", "name,entrypoints", "--json"]) == {"name", "entry_points"}
+    assert requested_fields(["setup.py", "meta", "--query=name", "--query", "version"]) == {"name", "version"}
+    assert requested_fields(["setup.py", "meta", "--query=name", "explain"]) is None
+
+    watch_requested = setupmeta.model.watch_requested
+    assert not watch_requested(["setup.py", "explain"])
+    assert not watch_requested(["setup.py", "--name", "-w"])
+    assert watch_requested(["setup.py", "-q", "explain", "--watch"])
+    assert watch_requested(["setup.py", "explain", "-c10", "-w"])
+
+
+def test_compute():
+    definitions = setupmeta.compute(conftest.resouce("scenarios", "simple-src"))
+    assert definitions["name"].value == "my-app"
+    assert definitions["name"].source == "explicit"
+    assert definitions["package_dir"].value == {"": "src"}
+    assert definitions["py_modules"].value == ["my_app"]
+    assert setupmeta.MetaDefs.project_dir == conftest.PROJECT_DIR
+
+    definitions = setupmeta.compute(conftest.resouce("scenarios", "simple-src"), fields=["name", "version"], attrs={"name": "foo"})
+    assert sorted(definitions) == ["name"]
+    assert definitions["name"].value == "foo"
+
+    # Only requested fields are computed
+    with patch("setupmeta.model.SetupMeta.auto_fill_packages", side_effect=Exception):
+        definitions = setupmeta.compute(conftest.resouce("scenarios", "complex-reqs"), fields="name,install_requires")
+        assert sorted(definitions) == ["install_requires", "name"]
+
+    with setupmeta.temp_resource() as temp:
+        with open("setup.py", "w") as fh:
+            fh.write("import setuptools\nNAME = 'foo'\nsetuptools.setup(name=NAME, version='1.0', setup_requires=['setupmeta'])\n")
+
+        assert setupmeta.setup_py_attrs(os.path.join(temp, "setup.py")) == {"version": "1.0", "setup_requires": ["setupmeta"]}
+        assert setupmeta.setup_py_attrs(os.path.join(temp, "no-such-file.py")) == {}
+
+
+def touch(path, contents):
+    """Write 'contents' to 'path', and make sure its mtime moves forward (file systems can have coarse mtime resolution)"""
+    mtime = os.path.getmtime(path) + 10 if os.path.exists(path) else None
+    with open(path, "w") as fh:
+        fh.write(contents)
+
+    if mtime:
+        os.utime(path, (mtime, mtime))
+
+
+def test_rerun_auto_fill():
+    old_project_dir = setupmeta.MetaDefs.project_dir
+    try:
+        with setupmeta.temp_resource() as temp:
+            touch("foo.py", "__version__ = '1.0'\n")
+            touch("README.rst", "Foo project\n")
+            touch("requirements.txt", "click\n")
+            attrs = {"name": "foo", "_setup_py_path": os.path.join(temp, "setup.py")}
+            meta = setupmeta.model.SetupMeta().preprocess(dict(attrs))
+            meta.watched = True
+            meta.finalize(attrs)
+            assert meta.steps[0].name == "auto_fill_modules"
+            assert "foo.py" in meta.steps[0].inputs
+            assert meta.first_outdated_step() is None
+            assert meta.value("description") == "Foo project"
+            assert meta.value("install_requires") == ["click"]
+
+            touch("README.rst", "Bar project\n")
+            start = meta.first_outdated_step()
+            assert meta.steps[start].name == "auto_fill_long_description"
+            meta.run_auto_fill(start)
+            assert meta.first_outdated_step() is None
+            assert meta.value("description") == "Bar project"
+            assert len(meta.definitions["description"].sources) == 1
+            assert meta.value("version") == "1.0"
+
+            touch("requirements.txt", "click\nrequests\n")
+            start = meta.first_outdated_step()
+            assert meta.steps[start].name == "auto_fill_requirements"
+            meta.run_auto_fill(start)
+            assert meta.value("install_requires") == ["click", "requests"]
+            assert len(meta.steps) == len(meta.auto_fill_steps())
+
+            touch("foo.py", "__version__ = '1.1'\n")
+            assert meta.first_outdated_step() == 0
+            meta.run_auto_fill(0)
+            assert meta.value("version") == "1.1"
+            assert len(meta.definitions["version"].sources) == 1
+
+    finally:
+        setupmeta.MetaDefs.project_dir = old_project_dir
+
+
+def test_rerun_auto_fill_package():
+    old_project_dir = setupmeta.MetaDefs.project_dir
+    try:
+        with setupmeta.temp_resource() as temp:
+            os.mkdir("bar")
+            touch(os.path.join("bar", "__init__.py"), "import os\n")
+            touch(os.path.join("bar", "__version__.py"), "__version__ = '1.0'\n")
+            attrs = {"name": "bar", "_setup_py_path": os.path.join(temp, "setup.py")}
+            meta = setupmeta.model.SetupMeta().preprocess(dict(attrs))
+            meta.watched = True
+            meta.finalize(attrs)
+            assert meta.value("packages") == ["bar"]
+            assert meta.value("author") is None
+            assert os.path.join("bar", "__about__.py") in meta.steps[0].inputs  # Candidates are recorded, even if they don't exist
+            assert os.path.join("bar", "__init__.py") in meta.steps[0].inputs  # Even if they contributed no definitions
+            assert meta.first_outdated_step() is None
+
+            touch(os.path.join("bar", "__init__.py"), "import os\n__author__ = 'Someone'\n")
+            assert meta.first_outdated_step() == 0
+            meta.run_auto_fill(0)
+            assert meta.value("author") == "Someone"
+            assert meta.value("version") == "1.0"
+            assert meta.first_outdated_step() is None
+
+    finally:
+        setupmeta.MetaDefs.project_dir = old_project_dir
+
+
+def finalized_with_stats(folder, argv):
+    """
+    :param str folder: Project folder
+    :param list(str) argv: Command line to simulate
+    :return (SetupMeta, int): Finalized SetupMeta, and number of os.stat() calls made (outside of .git/)
+    """
+    old_project_dir = setupmeta.MetaDefs.project_dir
+    setup_py = os.path.join(folder, "setup.py")
+    attrs = dict(setupmeta.setup_py_attrs(setup_py), _setup_py_path=setup_py)
+    setupmeta.clear_caches()
+    try:
+        with patch("sys.argv", argv):
+            with patch("os.stat", side_effect=os.stat) as stat:
+                meta = setupmeta.model.SetupMeta().preprocess(dict(attrs))
+                meta.finalize(attrs)
+
+        return meta, len([c for c in stat.call_args_list if ".git" not in str(c[0][0])])
+
+    finally:
+        setupmeta.MetaDefs.project_dir = old_project_dir
+
+
+def test_name_is_lazy():
+    folder = os.path.join(conftest.PROJECT_DIR, "examples", "hierarchical")
+    full, full_stats = finalized_with_stats(folder, ["setup.py", "explain"])
+    assert len(full.steps) == len(full.auto_fill_steps())
+    assert all(step.fingerprint is None for step in full.steps)  # Not watching: no fingerprints taken
+
+    meta, stats = finalized_with_stats(folder, ["setup.py", "--name"])
+    assert meta.value("name") == "hierarchical"
+    assert meta.steps == []  # No auto-fill step needed to tell the name
+    assert stats < full_stats
+
+
+def test_unwatched_auto_fill():
+    old_project_dir = setupmeta.MetaDefs.project_dir
+    try:
+        with setupmeta.temp_resource() as temp:
+            touch("foo.py", "__version__ = '1.0'\n")
+            touch("README.rst", "Foo project\n")
+            attrs = {"name": "foo", "_setup_py_path": os.path.join(temp, "setup.py")}
+            meta = setupmeta.model.SetupMeta().preprocess(dict(attrs))
+            meta.watched = False
+            with patch("setupmeta.model.AutoFillStep.current_fingerprint") as fingerprint:
+                meta.finalize(attrs)
+                assert fingerprint.call_count == 0
+
+            assert meta.value("description") == "Foo project"
+            assert "foo.py" in meta.steps[0].inputs  # Scanned paths are still known
+            assert meta.steps[0].snapshot is not None  # Allows to start watching later on
+            assert all(step.snapshot is None and step.fingerprint is None for step in meta.steps[1:])
+            assert meta.first_outdated_step() == 0
+
+            # This is what 'explain --watch' does when it wasn't requested via sys.argv
+            meta.watched = True
+            meta.run_auto_fill(0)
+            assert meta.first_outdated_step() is None
+            assert meta.value("version") == "1.0"
+            assert len(meta.definitions["version"].sources) == 1
+
+    finally:
+        setupmeta.MetaDefs.project_dir = old_project_dir
+
+
+def test_rerun_auto_fill_version(sample_project):
+    old_project_dir = setupmeta.MetaDefs.project_dir
+    try:
+        attrs = {"name": "sample", "versioning": "distance", "_setup_py_path": os.path.join(sample_project, "setup.py")}
+        meta = setupmeta.model.SetupMeta().preprocess(dict(attrs))
+        meta.watched = True
+        meta.finalize(attrs)
+        assert meta.value("version") == "0.0.1"
+        assert meta.first_outdated_step() is None
+
+        conftest.run_git("tag", "-a", "v0.3.0", "-m", "Version 0.3.0")
+        start = meta.first_outdated_step()
+        assert meta.steps[start].name == "auto_fill_version"
+        meta.run_auto_fill(start)
+        assert meta.value("version") == "0.3.0"
+        assert meta.first_outdated_step() is None
+
+        with open(".gitignore", "a") as fh:
+            fh.write("foo\n")
+
+        with conftest.capture_output():
+            start = meta.first_outdated_step()
+            assert meta.steps[start].name == "auto_fill_version"
+            meta.run_auto_fill(start)
+
+        assert meta.value("version") == "0.3.0.dirty"
+
+    finally:
+        setupmeta.MetaDefs.project_dir = old_project_dir
+
+
+def test_cached_compute():
+    with setupmeta.temp_resource() as temp:
+        project = os.path.join(temp, "project")
+        os.mkdir(project)
+        with patch.dict(os.environ, {"SETUPMETA_CACHE_DIR": os.path.join(temp, "cache")}):
+            with setupmeta.current_folder(project):
+                touch("setup.py", "from setuptools import setup\nsetup(name='foo')\n")
+                os.mkdir("foo")
+                touch(os.path.join("foo", "__init__.py"), "import os\n")
+                touch(os.path.join("foo", "__version__.py"), "__version__ = '1.0'\n")
+                touch("README.rst", "Foo project\n")
+                touch("requirements.txt", "click\n")
+
+            auto_fill_modules = setupmeta.model.SetupMeta.auto_fill_modules
+            with patch("setupmeta.model.SetupMeta.auto_fill_modules", side_effect=auto_fill_modules, autospec=True) as m:
+                definitions = setupmeta.compute(project)
+                assert definitions["description"].value == "Foo project"
+                assert m.call_count == 1
+
+                cached = setupmeta.compute(project)
+                assert m.call_count == 1  # Served from cache
+                assert sorted(cached) == sorted(definitions)
+                assert cached["install_requires"].value == ["click"]
+                assert cached["version"].value == "1.0"
+                assert cached["version"].source == "foo/__version__.py:1"
+
+                with setupmeta.current_folder(project):
+                    touch("requirements.txt", "click\nrequests\n")
+
+                definitions = setupmeta.compute(project)
+                assert m.call_count == 2  # An input changed
+                assert definitions["install_requires"].value == ["click", "requests"]
+                assert "author" not in definitions
+
+                with setupmeta.current_folder(project):
+                    touch(os.path.join("foo", "__init__.py"), "import os\n__author__ = 'Someone'\n")
+
+                definitions = setupmeta.compute(project)
+                assert m.call_count == 3  # A module that previously contributed no definitions changed
+                assert definitions["author"].value == "Someone"
+
+
+def test_persisted_definitions():
+    old_project_dir = setupmeta.MetaDefs.project_dir
+    try:
+        with setupmeta.temp_resource() as temp:
+            touch("foo.py", "__version__ = '1.0'\n")
+            touch("README.rst", "Foo project\n")
+            attrs = {"name": "foo", "cmdclass": {"foo": object}, "_setup_py_path": os.path.join(temp, "setup.py")}
+            meta = setupmeta.model.SetupMeta().preprocess(dict(attrs))
+            meta.finalize(dict(attrs))
+            meta.save_definitions("setupmeta.json")
+
+            loaded = setupmeta.model.SetupMeta()
+            assert not loaded.load_definitions(attrs, "no-such-file.json")
+            with patch("setupmeta.model.SetupMeta.finalize") as finalize:
+                assert loaded.load_definitions(attrs, "setupmeta.json")
+                assert not finalize.called
+
+            assert loaded.to_dict() == meta.to_dict()
+            assert loaded.definitions["version"].source == "foo.py:1"
+            assert loaded.definitions["cmdclass"].value == {"foo": object}  # Explicit values are taken from setup() attrs
+
+    finally:
+        setupmeta.MetaDefs.project_dir = old_project_dir
+
+
+def test_build_meta():
+    from setupmeta import build_meta
+
+    def build_wheel(wheel_directory, metadata_directory=None):
+        # Frontends call each hook in a fresh process, distutils remembers which folders it created for the lifetime of a process
+        dir_util = sys.modules.get("distutils.dir_util")
+        getattr(dir_util, "_path_created", {}).clear()
+        return build_meta.build_wheel(wheel_directory, metadata_directory=metadata_directory)
+
+    old_project_dir = setupmeta.MetaDefs.project_dir
+    try:
+        with setupmeta.temp_resource() as temp:
+            touch("setup.py", "from setuptools import setup\nsetup(name='foo', setup_requires='setupmeta')\n")
+            touch("foo.py", "__version__ = '1.0'\n")
+            setupmeta.MetaDefs.project_dir = temp  # Frontends run build hooks from project folder, in a fresh process
+            metadata_directory = os.path.join(temp, "metadata")
+            wheel_directory = os.path.join(temp, "wheels")
+            persisted = os.path.join(metadata_directory, build_meta.METADATA_FILE)
+            os.mkdir(metadata_directory)
+            finalize = setupmeta.model.SetupMeta.finalize
+            with patch("setupmeta.model.SetupMeta.finalize", side_effect=finalize, autospec=True) as m:
+                with conftest.capture_output():
+                    dist_info = build_meta.prepare_metadata_for_build_wheel(metadata_directory)
+                    assert m.call_count == 1
+                    assert os.path.isfile(persisted)
+
+                    # Subsequent hooks of the same build reuse persisted definitions
+                    assert build_wheel(wheel_directory, metadata_directory=metadata_directory).startswith("foo-1.0-")
+                    dist_info = os.path.join(metadata_directory, dist_info)
+                    assert build_wheel(wheel_directory, metadata_directory=dist_info).startswith("foo-1.0-")
+                    assert m.call_count == 1
+
+                    # Missing or corrupt persisted definitions: fall back to a full finalize
+                    os.unlink(persisted)
+                    build_wheel(wheel_directory, metadata_directory=metadata_directory)
+                    assert m.call_count == 2
+
+                    touch(persisted, "{corrupt")
+                    build_wheel(wheel_directory, metadata_directory=metadata_directory)
+                    assert m.call_count == 3
+
+                    # Without metadata directory, nothing is persisted
+                    os.unlink(persisted)
+                    build_wheel(wheel_directory)
+                    assert m.call_count == 4
+                    assert not os.path.exists(persisted)
+
+            assert setupmeta.build_meta.hook.persisted_metadata is None
+
+    finally:
+        setupmeta.MetaDefs.project_dir = old_project_dir
+
+
+def test_static_project_name():
+    with setupmeta.temp_resource() as temp:
+        projects = [
+            ("pkg-info", "PKG-INFO", "Metadata-Version: 2.1\nName: from-pkg-info\nVersion: 1.0\n"),
+            ("setup-cfg", "setup.cfg", "[bdist_wheel]\nname = nope\n\n[metadata]\nname = from-setup-cfg\n"),
+            ("pyproject", "pyproject.toml", '[build-system]\nrequires = ["setuptools"]\n\n[project]\nname = "from-pyproject"\n'),
+            ("literal", "setup.py", "from setuptools import setup\nsetup(name='from-literal')\n"),
+            ("title", "setup.py", "__title__ = 'from-title'\nfrom setuptools import setup\nsetup(name=__title__)\n"),
+            ("dynamic1", "setup.py", "from setuptools import setup\nsetup(name='dynamic' + '-1')\n"),
+            ("dynamic2", "setup.py", "from setuptools import setup\nsetup(name='dynamic' + '-2')\n"),
+        ]
+        lines = ["# Local projects"]
+        for folder, name, contents in projects:
+            os.mkdir(folder)
+            touch(os.path.join(folder, name), contents)
+            lines.append("file://%s" % os.path.join(temp, folder))
+
+        lines.append("-e %s" % os.path.join(temp, "dynamic1"))
+        assert setupmeta.static_project_name(os.path.join(temp, "dynamic1")) is None
+        with patch("setupmeta.setup_py_project_name", side_effect=setupmeta.setup_py_project_name) as launched:
+            f = setupmeta.RequirementsFile()
+            f.scan(lines)
+            f.finalize()
+            assert launched.call_count == 2  # Only the 2 'dynamic' projects required running their setup.py (in parallel)
+
+        assert f.filled_requirements == [
+            "from-pkg-info", "from-setup-cfg", "from-pyproject", "from-literal", "from-title", "dynamic-1", "dynamic-2"
+        ]
+
+
+def test_parsed_requirements_cache():
+    with setupmeta.temp_resource() as temp:
+        common = os.path.join(temp, "common.txt")
+        install = os.path.join(temp, "requirements.txt")
+        dev = os.path.join(temp, "dev.txt")
+        touch(common, "click==8.0\n")
+        touch(install, "-r common.txt\nrequests==2.0\n")
+        touch(dev, "-r common.txt\n-r requirements.txt\npytest\n")
+        with patch("setupmeta.readlines", side_effect=setupmeta.readlines) as read:
+            assert setupmeta.requirements_from_file(install) == ["click", "requests"]
+            f = setupmeta.RequirementsFile.from_file(dev, do_abstract=False)
+            assert f.filled_requirements == ["click==8.0", "requests==2.0", "pytest"]
+            assert setupmeta.requirements_from_file(dev) == ["click", "requests", "pytest"]
+            assert setupmeta.requirements_from_file(install) == ["click", "requests"]
+            # Each file is read once per 'do_abstract' value
+            assert sorted(os.path.basename(c[0][0]) for c in read.call_args_list) == [
+                "common.txt", "common.txt", "dev.txt", "dev.txt", "requirements.txt", "requirements.txt"
+            ]
+
+            read.reset_mock()
+            touch(common, "click==8.0\nattrs==20.0\n")
+            assert setupmeta.requirements_from_file(install) == ["click", "attrs", "requests"]
+            assert [os.path.basename(c[0][0]) for c in read.call_args_list] == ["requirements.txt", "common.txt"]
+
+        with patch("setupmeta.readlines", side_effect=setupmeta.readlines) as read:
+            paths = [dev, install, os.path.join(temp, "missing.txt"), install]
+            reqs = setupmeta.requirements_from_files(paths)
+            assert reqs == {dev: ["click", "attrs", "requests", "pytest"], install: ["click", "attrs", "requests"], paths[2]: None}
+            assert sorted(os.path.basename(c[0][0]) for c in read.call_args_list) == ["dev.txt", "missing.txt"]
+
+        # Cyclic references are followed only once, and not cached
+        touch(common, "-r dev.txt\nclick==8.0\n")
+        f = setupmeta.RequirementsFile.from_file(install)
+        assert f.is_cyclic
+        assert f.filled_requirements == ["pytest", "click", "requests"]
+        assert setupmeta.RequirementsFile.from_file(install) is not f
+
+        # A file replaced by one with same size and mtime (editors can save via a rename) is noticed
+        touch(common, "click==8.0\n")
+        assert setupmeta.RequirementsFile.from_file(install, do_abstract=False).filled_requirements == ["click==8.0", "requests==2.0"]
+        st = os.stat(common)
+        touch(common + ".new", "click==9.0\n")
+        if hasattr(st, "st_mtime_ns"):
+            os.utime(common + ".new", ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        else:  # pragma: no cover, py2
+            os.utime(common + ".new", (st.st_atime, st.st_mtime))
+
+        os.rename(common + ".new", common)
+        assert setupmeta.RequirementsFile.from_file(install, do_abstract=False).filled_requirements == ["click==9.0", "requests==2.0"]
+
+        # Parsed files can be shared by several projects, their sources are relative to the project asking
+        old_project_dir = setupmeta.MetaDefs.project_dir
+        try:
+            setupmeta.MetaDefs.project_dir = temp
+            f = setupmeta.RequirementsFile.from_file(install)
+            assert f.source == "common.txt"  # First requirement came from there
+            assert f.reqs[-1].source == "requirements.txt"
+
+            setupmeta.MetaDefs.project_dir = os.path.dirname(temp)
+            assert setupmeta.RequirementsFile.from_file(install) is f
+            folder = os.path.basename(temp)
+            assert f.source == os.path.join(folder, "common.txt")
+            assert str(f.reqs[-1]) == "requests from %s:2, abstracted by default" % os.path.join(folder, "requirements.txt")
+
+        finally:
+            setupmeta.MetaDefs.project_dir = old_project_dir
+
+
+def slow_readlines(path, readlines=setupmeta.readlines):
+    time.sleep(0.05)  # Make sure parsing threads overlap
+    return readlines(path)
+
+
+def test_parallel_requirements():
+    with setupmeta.temp_resource() as temp:
+        common = os.path.join(temp, "common.txt")
+        touch(common, "click==8.0\n")
+        paths = []
+        for i in range(4):
+            path = os.path.join(temp, "reqs%s.txt" % i)
+            touch(path, "-r common.txt\nfoo%s\n" % i)
+            paths.append(path)
+
+        with patch("setupmeta.readlines", side_effect=slow_readlines) as read:
+            reqs = setupmeta.requirements_from_files(paths)
+            assert reqs[paths[3]] == ["click", "foo3"]
+            # Shared file is parsed only once, even though it was referred to from 4 files parsed in parallel
+            assert sorted(os.path.basename(c[0][0]) for c in read.call_args_list).count("common.txt") == 1
+
+        # Cyclic references parsed from several threads don't deadlock
+        touch(paths[0], "-r reqs1.txt\nfoo0\n")
+        touch(paths[1], "-r reqs0.txt\nfoo1\n")
+        results = []
+        with patch("setupmeta.readlines", side_effect=slow_readlines):
+            thread = threading.Thread(target=lambda: results.append(setupmeta.requirements_from_files(paths[:2])))
+            thread.daemon = True
+            thread.start()
+            thread.join(10)
+
+        assert results == [{paths[0]: ["foo1", "foo0"], paths[1]: ["foo0", "foo1"]}]